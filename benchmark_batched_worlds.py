@@ -0,0 +1,28 @@
+import copy
+import time
+import numpy as np
+from creature import creature
+from simulation import simulation
+
+# Compare one creature per world with K creatures sharing a world and its stepSimulation calls
+n_creatures = 16
+max_frame = 2400
+creatures = [creature.Creature(np.random.randint(2, 8)) for _ in range(n_creatures)]
+sim = simulation.Simulation(sample_interval = 240, warm_world = True)
+
+singles = copy.deepcopy(creatures)
+start = time.perf_counter()
+for cr in singles:
+    sim.run_creature(cr, max_frame = max_frame)
+single_time = time.perf_counter() - start
+single_dists = np.array([cr.get_distance() for cr in singles])
+
+for batch_size in [1, 2, 4, 8, 16]:
+    batched = copy.deepcopy(creatures)
+    start = time.perf_counter()
+    for i in range(0, n_creatures, batch_size):
+        sim.run_creatures(batched[i:i + batch_size], max_frame = max_frame)
+    batch_time = time.perf_counter() - start
+
+    error = np.max(np.abs(np.array([cr.get_distance() for cr in batched]) - single_dists))
+    print(f"K = {batch_size:>2} | {n_creatures / batch_time:6.2f} creatures/s | speedup {single_time / batch_time:5.2f}x | max distance error {error:.4f}")
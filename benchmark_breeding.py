@@ -0,0 +1,24 @@
+import time
+import numpy as np
+from creature import genome
+from simulation import manipulation
+
+# Compare breeding one child at a time with the batched kernels for a whole generation
+spec = genome.GeneSpec.get_gene_spec()
+n_repeat = 3
+
+for pop_size in [100, 1000, 10000]:
+    dnas = [genome.Genome.init_random_genome(np.random.randint(2, 15), len(spec)) for _ in range(pop_size)]
+    pairs = manipulation.Selection.select_parent_index_pairs(np.random.random(pop_size), pop_size)
+
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        children = [manipulation.NewGeneration.generate_child_dna(dnas[id1], dnas[id2]) for id1, id2 in pairs]
+    child_time = (time.perf_counter() - start) / n_repeat
+
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        children = manipulation.NewGeneration.generate_children_dna(dnas, pairs)
+    batch_time = (time.perf_counter() - start) / n_repeat
+
+    print(f"{pop_size:>6} children | per child {child_time * 1000:9.2f} ms | batched {batch_time * 1000:8.2f} ms | speedup {child_time / batch_time:5.1f}x")
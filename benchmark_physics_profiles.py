@@ -0,0 +1,31 @@
+import copy
+import time
+import numpy as np
+from creature import creature
+from simulation import manipulation, simulation
+
+# Rank correlation of every physics profile's fitness with the full fidelity one on a sample population
+n_creatures = 30
+max_frame = 2400
+creatures = [creature.Creature(np.random.randint(2, 7)) for _ in range(n_creatures)]
+sim = simulation.Simulation(sample_interval = 240, warm_world = True)
+
+def get_ranks(fits):
+    return np.argsort(np.argsort(fits, kind = "stable"), kind = "stable")
+
+results = {}
+for name in ["full", "screening"]:
+    profile = simulation.PhysicsProfile.get_profile(name)
+    crs = copy.deepcopy(creatures)
+    start = time.perf_counter()
+    for cr in crs:
+        sim.run_creature(cr, max_frame = max_frame, profile = profile)
+    results[name] = (time.perf_counter() - start, manipulation.Selection.eval_fitness(crs))
+
+full_time, full_fits = results["full"]
+n_top = n_creatures // 4
+full_top = set(np.argsort(full_fits)[::-1][:n_top])
+for name, (seconds, fits) in results.items():
+    spearman = np.corrcoef(get_ranks(full_fits), get_ranks(fits))[0, 1]
+    top_overlap = len(full_top & set(np.argsort(fits)[::-1][:n_top])) / n_top
+    print(f"{name:>10} | {seconds / n_creatures * 1000:8.1f} ms/creature | speedup {full_time / seconds:5.1f}x | spearman {spearman:6.3f} | top {n_top} overlap {top_overlap:4.0%}")
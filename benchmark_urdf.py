@@ -0,0 +1,27 @@
+import time
+import numpy as np
+from creature import creature, genome
+
+# Compare the minidom URDF writer with the string writer on large expanded creatures
+spec = genome.GeneSpec.get_gene_spec()
+n_repeat = 5
+
+for gene_count in [3, 5, 7]:
+    cr = creature.Creature(gene_count, spec)
+    dna = cr.dna
+    dna[:, spec["link_recurrence"]["index"]] = 0.99 # every gene repeats 3 times
+    cr.update_dna(dna)
+    links = cr.get_expanded_links()
+
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        xml_str = creature.Creature.creature_to_xml(links).toprettyxml()
+    dom_time = (time.perf_counter() - start) / n_repeat
+
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        urdf_str = creature.Creature.creature_to_urdf(links)
+    str_time = (time.perf_counter() - start) / n_repeat
+
+    assert xml_str == urdf_str
+    print(f"{len(links):>5} links | minidom {dom_time * 1000:8.2f} ms | string {str_time * 1000:8.2f} ms | speedup {dom_time / str_time:5.1f}x")
@@ -1,8 +1,11 @@
+import io
+import hashlib
 import numpy as np
 import copy
 from dataclasses import dataclass
 from enum import Enum
 from xml.dom.minidom import getDOMImplementation
+from xml.sax.saxutils import escape
 from creature import genome, motor
 
 @dataclass
@@ -19,21 +22,39 @@ class Creature:
     __link_shapes = ("box", "cylinder", "sphere")
     __joint_types = ("revolute", "continuous")
     __joint_axes  = ("1 0 0", "0 1 0", "0 0 1")
-    __counter = 0
     
-    def __init__(self, gene_count, gene_spec = genome.GeneSpec.get_gene_spec()):
-        self.dna = genome.Genome.init_random_genome(gene_count, len(gene_spec))
+    def __init__(self, gene_count, gene_spec = genome.GeneSpec.get_gene_spec(), rng = None, dna = None):
+        # a given genome is kept as it is, links and motors are only decoded when they are asked for
+        if dna is None:
+            dna = genome.Genome.init_random_genome(gene_count, len(gene_spec), rng)
+        assert dna.shape[-1] == len(gene_spec)
+        self.dna = dna
         self.spec = gene_spec
         self.start_position = (0, 0, 0)
         self.last_position = (0, 0, 0)
+        self.exit_reason = None
+        self.exit_frame = None
+        self.physics_profile = None
         self.motors = None
+        self.motor_bank = None
         self.__flat_links = None
         self.__expanded_links = None
+        self.__control_schedule = None
+
+    def __getstate__(self):
+        # links and motors are rebuilt from the dna, keep them out of pickles sent between processes
+        state = self.__dict__.copy()
+        state["motors"] = None
+        state["motor_bank"] = None
+        state["_Creature__flat_links"] = None
+        state["_Creature__expanded_links"] = None
+        state["_Creature__control_schedule"] = None
+        return state
 
     def get_flat_links(self):
         if self.__flat_links == None:
-            g_dicts = genome.Genome.genome_to_dict(self.dna, self.spec)
-            self.__flat_links = Creature.genome_to_links(g_dicts)
+            genome_array = genome.GeneSpec.compile_spec(self.spec).decode(self.dna)
+            self.__flat_links = Creature.genome_to_links(genome_array)
         return self.__flat_links
 
     def get_expanded_links(self):
@@ -41,15 +62,20 @@ class Creature:
             self.__expanded_links = Creature.expand_links(self.get_flat_links())
         return self.__expanded_links
 
+    def get_expanded_link_count(self):
+        if self.__expanded_links != None:
+            return len(self.__expanded_links)
+        return Creature.count_expanded_links(self.dna, self.spec)
+
     def get_robot_xml(self):
         return Creature.creature_to_xml(self.get_expanded_links())
 
+    def get_robot_urdf(self):
+        return Creature.creature_to_urdf(self.get_expanded_links())
+
     def write_robot_xml(self, path):
-        if self.__expanded_links == None:
-            self.__expanded_links = Creature.expand_links(self.get_flat_links())
         with open(path, "w") as f:
-            xml_str = self.get_robot_xml().toprettyxml()
-            f.write(xml_str)
+            Creature.write_urdf(self.get_expanded_links(), f)
         return None
     
     def get_motors(self):
@@ -64,6 +90,37 @@ class Creature:
             self.motors = motors
         return self.motors
 
+    def get_motor_bank(self):
+        if self.motor_bank == None:
+            self.motor_bank = motor.MotorBank.from_motors(self.get_motors())
+        return self.motor_bank
+
+    def get_morphology_key(self):
+        # digest of every gene but the motor controls, controller variants of one body share it
+        control_ids = [self.spec[key]["index"] for key in ["control_waveform", "control_amp", "control_freq"]]
+        body = np.ascontiguousarray(np.delete(np.atleast_2d(self.dna), control_ids, axis = 1), dtype = np.float64)
+        digest = hashlib.sha1()
+        digest.update(str(body.shape).encode())
+        digest.update(body.tobytes())
+        return digest.hexdigest()
+
+    def is_immobile(self):
+        # without joints or with every amplitude at zero no motor ever drives the robot, the root gene
+        # never recurs so the joints' motors are genes 1 and up, nothing is expanded
+        if self.get_expanded_link_count() == 1:
+            return True
+        amps = genome.GeneSpec.compile_spec(self.spec).decode_key(np.atleast_2d(self.dna), "control_amp")[1:]
+        return bool(np.all(amps == 0))
+
+    def get_control_schedule(self, max_frame = 2400, control_interval = 240):
+        # target velocities of every control update in a run, row i is sent at frame i * control_interval
+        n_steps = -(-max_frame // control_interval)
+        if self.__control_schedule is None or len(self.__control_schedule) < n_steps:
+            bank = motor.MotorBank.from_motors(self.get_motors())
+            bank.phases[:] = 0
+            self.__control_schedule = bank.get_schedule(n_steps)
+        return self.__control_schedule[:n_steps]
+
     def reset_start_position(self, start_position):
         self.start_position = start_position
         return self.start_position
@@ -81,13 +138,27 @@ class Creature:
         self.dna = new_dna
         self.start_position = (0, 0, 0)
         self.last_position = (0, 0, 0)
+        self.exit_reason = None
+        self.exit_frame = None
+        self.physics_profile = None
         self.motors = None
+        self.motor_bank = None
         self.__flat_links = None
         self.__expanded_links = None
+        self.__control_schedule = None
         self.get_motors()
 
+    @staticmethod
+    def get_distances(start_positions, last_positions):
+        # one norm per row, norm(axis = -1) rounds differently from get_distance
+        diffs = np.asarray(last_positions, dtype = np.float64) - np.asarray(start_positions, dtype = np.float64)
+        dists = np.array([np.linalg.norm(diff) for diff in diffs.reshape(-1, diffs.shape[-1])])
+        return np.nan_to_num(dists.reshape(diffs.shape[:-1]))
+
     @staticmethod
     def genome_to_links(genome_dicts):
+        if isinstance(genome_dicts, np.ndarray):
+            genome_dicts = genome.Genome.array_to_dict(genome_dicts)
         link_names = ["Link_" + str(i) for i in range(len(genome_dicts))]
         flat_links = []
         for i, gene_dict in enumerate(genome_dicts):
@@ -99,49 +170,79 @@ class Creature:
         return flat_links
     
     @staticmethod
-    def expand_links(flat_links):       
-        flat_links[0].recur == 1 
+    def expand_links(flat_links):
         assert flat_links[0].recur == 1
-        exp_links = Creature.__expand_links_recursive(flat_links[0], flat_links[1:])
-        Creature.__counter = 0
+        gene_ids, parent_ids, sib_ids = Creature.expand_tree([link.recur for link in flat_links])
+
+        exp_links = []
+        for gene_id, parent_id, sib_id in zip(gene_ids.tolist(), parent_ids.tolist(), sib_ids.tolist()):
+            flat_link = flat_links[gene_id]
+            name = flat_link.name + "_" + str(sib_id) + "_" + str(len(exp_links))
+            parent_name = exp_links[parent_id].name if parent_id >= 0 else flat_link.parent_name
+            exp_links.append(CreatureLink(name, flat_link.gene_dict, parent_name, flat_link.recur))
         return exp_links
 
     @staticmethod
-    def __expand_links_recursive(parent, child_links, child_id = "0"):
-        p_copy = copy.copy(parent)
-        p_copy.name += ("_" + str(child_id) + "_" + str(Creature.__counter))
-        Creature.__counter += 1
-        exp_links = [p_copy]
-        if len(child_links) > 0:
-            for i in range(child_links[0].recur):
-                child = Creature.__expand_links_recursive(child_links[0], child_links[1:], i)
-                c_copy = copy.copy(child)
-                c_copy[0].parent_name = p_copy.name
-                exp_links.extend(c_copy)
-        return exp_links
+    def expand_tree(recurs):
+        # iterative pre-order expansion, the position of a link in the output is its naming counter
+        n_links = Creature.count_links(recurs)
+        gene_ids = np.empty(n_links, dtype = np.int64)
+        parent_ids = np.empty(n_links, dtype = np.int64)
+        sib_ids = np.empty(n_links, dtype = np.int64)
+
+        stack = [(0, -1, 0)]
+        for index in range(n_links):
+            gene_id, parent_id, sib_id = stack.pop()
+            gene_ids[index], parent_ids[index], sib_ids[index] = gene_id, parent_id, sib_id
+            if gene_id + 1 < len(recurs):
+                stack.extend((gene_id + 1, index, i) for i in range(recurs[gene_id + 1] - 1, -1, -1))
+        return gene_ids, parent_ids, sib_ids
 
     @staticmethod
-    def link_to_xml(name, parent_name, gene_dict, adom, sib_ind = None):
-        link_shape = Creature.__link_shapes[ gene_dict["link_shape"] ]
-        joint_type = Creature.__joint_types[ gene_dict["joint_type"] ]
-        joint_axis = Creature.__joint_axes[ gene_dict["joint_axis_xyz"] ]
-        
-        if sib_ind == None:
-            try:
-                sib_ind = int(name.split("_")[2]) # ex: Link_1_2_4
-            except:
-                sib_ind = 0
+    def get_recurrences(dna, spec):
+        # same decoding as genome_to_links, only for the recurrence column
+        recurs = genome.GeneSpec.compile_spec(spec).decode_key(np.atleast_2d(dna), "link_recurrence").tolist()
+        if len(recurs) > 0:
+            recurs[0] = 1
+        return recurs
 
-        shape_tag = adom.createElement(link_shape)
+    @staticmethod
+    def count_expanded_links(dna, spec):
+        # 1 + r1 + r1*r2 + ... computed from the dna, no expansion
+        return Creature.count_links(Creature.get_recurrences(dna, spec))
+
+    @staticmethod
+    def count_expanded_links_padded(stacked, lengths, spec):
+        # count_expanded_links for every genome of a zero-padded (n, max_genes, gene_length) stack
+        recurs = genome.GeneSpec.compile_spec(spec).decode_key(stacked, "link_recurrence")
+        return Creature.count_links_padded(recurs, lengths)
+
+    @staticmethod
+    def count_links_padded(recurs, lengths):
+        mask = np.arange(recurs.shape[1]) < np.asarray(lengths)[:, None]
+        levels = np.where(mask, recurs, 1)
+        levels[:, 0] = 1
+        return np.sum(np.cumprod(levels, axis = 1) * mask, axis = 1)
+
+    @staticmethod
+    def count_links(recurs):
+        n_links, n_level = 1, 1
+        for recur in recurs[1:]:
+            n_level *= int(recur)
+            n_links += n_level
+        return n_links
+
+    @staticmethod
+    def link_to_geometry(gene_dict):
+        link_shape = Creature.__link_shapes[ gene_dict["link_shape"] ]
         if link_shape == "box":
             link_size = " ".join([str(gene_dict["link_length_1"]), str(gene_dict["link_length_2"]), str(gene_dict["link_length_3"])])
-            shape_tag.setAttribute("size", str(link_size))
+            shape_attrs = {"size": link_size}
             link_volume    = gene_dict["link_length_1"] * gene_dict["link_length_2"] *  gene_dict["link_length_3"]
         elif link_shape =="cylinder":
             link_length = np.mean([gene_dict["link_length_1"], gene_dict["link_length_2"], gene_dict["link_length_3"]])
             link_radius = gene_dict["link_radius"]
-            shape_tag.setAttribute("radius", str(link_radius))
-            shape_tag.setAttribute("length", str(link_length))
+            shape_attrs = {"radius": link_radius, "length": link_length}
             link_volume = np.pi * (gene_dict["link_length_1"] ** 2) * np.mean([
                 gene_dict["link_length_1"],
                 gene_dict["link_length_2"],
@@ -149,10 +250,47 @@ class Creature:
             ])
         else:
             link_radius = gene_dict["link_radius"]
-            shape_tag.setAttribute("radius", str(link_radius))
+            shape_attrs = {"radius": link_radius}
             link_volume = 4 / 3 * np.pi * (gene_dict["link_radius"] ** 3)
 
         link_mass = link_volume * gene_dict["link_mass_density"]
+        return link_shape, shape_attrs, link_mass
+
+    @staticmethod
+    def get_sibling_index(name):
+        try:
+            return int(name.split("_")[2]) # ex: Link_1_2_4
+        except:
+            return 0
+
+    @staticmethod
+    def link_to_joint_frame(name, gene_dict, sib_ind = None):
+        joint_type = Creature.__joint_types[ gene_dict["joint_type"] ]
+        joint_axis = Creature.__joint_axes[ gene_dict["joint_axis_xyz"] ]
+
+        if sib_ind == None:
+            sib_ind = Creature.get_sibling_index(name)
+
+        origin_xyz = [
+            gene_dict["joint_origin_xyz_1"] * sib_ind,
+            gene_dict["joint_origin_xyz_2"],
+            gene_dict["joint_origin_xyz_3"]
+        ]
+        origin_rpy = [
+            gene_dict["joint_origin_rpy_1"],
+            gene_dict["joint_origin_rpy_2"],
+            gene_dict["joint_origin_rpy_3"]
+        ]
+        return joint_type, joint_axis, origin_xyz, origin_rpy
+
+    @staticmethod
+    def link_to_xml(name, parent_name, gene_dict, adom, sib_ind = None):
+        joint_type, joint_axis, origin_xyz, origin_rpy = Creature.link_to_joint_frame(name, gene_dict, sib_ind)
+
+        link_shape, shape_attrs, link_mass = Creature.link_to_geometry(gene_dict)
+        shape_tag = adom.createElement(link_shape)
+        for attr_name, attr_value in shape_attrs.items():
+            shape_tag.setAttribute(attr_name, str(attr_value))
 
         # ----- LINK TAG -----
         mass_tag = adom.createElement("mass")
@@ -193,16 +331,8 @@ class Creature:
         joint_child_tag.setAttribute("link", name)
 
         joint_origin_tag = adom.createElement("origin")
-        joint_origin_tag.setAttribute("xyz", " ".join([
-            str(gene_dict["joint_origin_xyz_1"] * sib_ind),
-            str(gene_dict["joint_origin_xyz_2"]),
-            str(gene_dict["joint_origin_xyz_3"])
-        ]))
-        joint_origin_tag.setAttribute("rpy", " ".join([
-            str(gene_dict["joint_origin_rpy_1"]),
-            str(gene_dict["joint_origin_rpy_2"]),
-            str(gene_dict["joint_origin_rpy_3"])            
-        ]))
+        joint_origin_tag.setAttribute("xyz", " ".join(map(str, origin_xyz)))
+        joint_origin_tag.setAttribute("rpy", " ".join(map(str, origin_rpy)))
 
         joint_axis_tag = adom.createElement("axis")
         joint_axis_tag.setAttribute("xyz", str(joint_axis))
@@ -237,6 +367,75 @@ class Creature:
                 robot_tag.appendChild(joint_tag)
 
         return robot_tag  
+
+    @staticmethod
+    def gene_to_urdf_fragments(gene_dict):
+        # everything in a link/joint pair that only depends on the gene, split around the per-instance values
+        joint_type, joint_axis, origin_xyz, origin_rpy = Creature.link_to_joint_frame("", gene_dict, 1)
+        link_shape, shape_attrs, link_mass = Creature.link_to_geometry(gene_dict)
+
+        shape_str = "".join(f' {attr_name}="{str(attr_value)}"' for attr_name, attr_value in shape_attrs.items())
+        geometry_str = f"\t\t\t<geometry>\n\t\t\t\t<{link_shape}{shape_str}/>\n\t\t\t</geometry>\n"
+
+        link_body = (
+            '">\n'
+            f"\t\t<visual>\n{geometry_str}\t\t</visual>\n"
+            f"\t\t<collision>\n{geometry_str}\t\t</collision>\n"
+            f'\t\t<inertial>\n\t\t\t<mass value="{str(link_mass)}"/>\n'
+            '\t\t\t<inertia ixx="0.03" ixy="0.03" ixz="0.03" iyy="0" iyz="0" izz="0"/>\n'
+            "\t\t</inertial>\n"
+            "\t</link>\n"
+        )
+        joint_head = f'" type="{joint_type}">\n\t\t<parent link="'
+        joint_mid = f'"/>\n\t\t<axis xyz="{joint_axis}"/>\n\t\t<origin xyz="'
+        joint_tail = (
+            f' {" ".join(map(str, origin_xyz[1:]))}" rpy="{" ".join(map(str, origin_rpy))}"/>\n'
+            f'\t\t<limit effort="1" upper="{str(-np.pi)}" lower="{str(np.pi)}" velocity="1"/>\n'
+            "\t</joint>\n"
+        )
+        return link_body, joint_head, joint_mid, joint_tail
+
+    @staticmethod
+    def link_to_urdf(name, parent_name, gene_dict, sib_ind = None, fragments = None):
+        # string form of link_to_xml, laid out exactly like toprettyxml()
+        if fragments == None:
+            fragments = Creature.gene_to_urdf_fragments(gene_dict)
+        if sib_ind == None:
+            sib_ind = Creature.get_sibling_index(name)
+
+        link_body, joint_head, joint_mid, joint_tail = fragments
+        link_str = '\t<link name="' + name + link_body
+        joint_str = (
+            '\t<joint name="joint_' + name + joint_head + parent_name
+            + '"/>\n\t\t<child link="' + name + joint_mid
+            + str(gene_dict["joint_origin_xyz_1"] * sib_ind) + joint_tail
+        )
+        return link_str, joint_str
+
+    @staticmethod
+    def write_urdf(links, out, robot_name = "robot"):
+        robot_name = escape(robot_name, {'"': "&quot;"})
+        out.write(f'<robot name="{robot_name}">\n')
+
+        # expanded copies of a gene share its gene_dict, so its fragments are built once per creature
+        gene_fragments = {}
+        for i, link in enumerate(links):
+            fragments = gene_fragments.get(id(link.gene_dict))
+            if fragments == None:
+                fragments = Creature.gene_to_urdf_fragments(link.gene_dict)
+                gene_fragments[id(link.gene_dict)] = fragments
+
+            link_str, joint_str = Creature.link_to_urdf(link.name, link.parent_name, link.gene_dict, fragments = fragments)
+            out.write(link_str)
+            if i != 0:
+                out.write(joint_str)
+        out.write("</robot>\n")
+
+    @staticmethod
+    def creature_to_urdf(links, robot_name = "robot"):
+        buffer = io.StringIO()
+        Creature.write_urdf(links, buffer, robot_name)
+        return buffer.getvalue()
         
 
 
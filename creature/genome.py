@@ -2,13 +2,15 @@ import numpy as np
 
 class Genome:
     @staticmethod
-    def init_random_gene(n):
-        gene = np.random.uniform(size = n)
+    def init_random_gene(n, rng = None):
+        rng = np.random.default_rng(rng)
+        gene = rng.uniform(size = n)
         return gene
 
     @staticmethod
-    def init_random_genome(gene_count, gene_length): 
-        genome = np.array([Genome.init_random_gene(gene_length) for _ in range(gene_count)])
+    def init_random_genome(gene_count, gene_length, rng = None): 
+        rng = np.random.default_rng(rng)
+        genome = np.array([Genome.init_random_gene(gene_length, rng) for _ in range(gene_count)])
         return genome
 
     @staticmethod
@@ -26,11 +28,57 @@ class Genome:
 
     @staticmethod
     def genome_to_dict(genome, spec):
-        genome_dicts = [Genome.gene_to_dict(gene, spec) for gene in genome]
-        return genome_dicts
+        genome_array = GeneSpec.compile_spec(spec).decode(genome)
+        return Genome.array_to_dict(genome_array)
+
+    @staticmethod
+    def array_to_dict(genome_array):
+        names = genome_array.dtype.names
+        return [dict(zip(names, gene)) for gene in genome_array.tolist()]
+
+    @staticmethod
+    def stack_genomes(genomes):
+        # pad a list of (n_genes, gene_length) genomes into one (n_genomes, max_genes, gene_length) array
+        lengths = np.array([len(genome) for genome in genomes])
+        stacked = np.zeros((len(genomes), np.max(lengths), np.shape(genomes[0])[-1]))
+        for i, genome in enumerate(genomes):
+            stacked[i, :lengths[i]] = genome
+        return stacked, lengths
+
+class CompiledGeneSpec:
+    __type_codes = {"continuous": 0, "discrete": 1, "categorical": 2}
+
+    def __init__(self, spec):
+        self.names = list(spec.keys())
+        self.indices = np.array([spec[key]["index"] for key in self.names])
+        self.scales = np.array([spec[key]["scale"] for key in self.names], dtype = np.float64)
+        self.types = np.array([CompiledGeneSpec.__type_codes[spec[key]["type"]] for key in self.names])
+        self.dtype = np.dtype([
+            (key, np.float64 if spec[key]["type"] == "continuous" else np.int64) for key in self.names
+        ])
+
+    def decode(self, genome):
+        # same values as Genome.gene_to_dict for every gene of a gene, a genome or a stacked population
+        genome = np.asarray(genome, dtype = np.float64)
+        values = genome[..., self.indices] * self.scales
+        rounded = np.trunc(values) + (self.types == 1)
+        values = np.where(self.types == 0, values, rounded)
+
+        genome_array = np.empty(values.shape[:-1], dtype = self.dtype)
+        for i, key in enumerate(self.names):
+            genome_array[key] = values[..., i]
+        return genome_array
+
+    def decode_key(self, genome, key):
+        i = self.names.index(key)
+        values = np.asarray(genome, dtype = np.float64)[..., self.indices[i]] * self.scales[i]
+        if self.types[i] == 0:
+            return values
+        return (np.trunc(values) + (self.types[i] == 1)).astype(np.int64)
 
 class GeneSpec:
     __spec = None
+    __compiled = {}
 
     @staticmethod
     def set_default_gene_spec():
@@ -65,6 +113,15 @@ class GeneSpec:
         GeneSpec.__spec = spec
         return GeneSpec.__spec
 
+    @staticmethod
+    def compile_spec(spec = None):
+        if spec == None:
+            spec = GeneSpec.get_gene_spec()
+        spec_key = tuple((key, value["index"], value["scale"], value["type"]) for key, value in spec.items())
+        if spec_key not in GeneSpec.__compiled:
+            GeneSpec.__compiled[spec_key] = CompiledGeneSpec(spec)
+        return GeneSpec.__compiled[spec_key]
+
     @staticmethod
     def get_gene_spec():
         if GeneSpec.__spec == None:
@@ -21,4 +21,43 @@ class Motor:
 
     
     def __repr__(self):
-        return f"Motor\nType\t: {self.motor_type}\nAmp\t: {self.amp}\nFreq\t: {self.freq}\n"
\ No newline at end of file
+        return f"Motor\nType\t: {self.motor_type}\nAmp\t: {self.amp}\nFreq\t: {self.freq}\n"
+
+class MotorBank:
+    # the motors of every joint as arrays, one call gives the same values as calling each Motor
+    def __init__(self, control_waveforms, control_amps, control_freqs):
+        self.motor_types = np.array([MotorType(w).value for w in control_waveforms], dtype = np.int64)
+        self.amps = np.array(control_amps, dtype = np.float64)
+        self.freqs = np.array(control_freqs, dtype = np.float64)
+        self.phases = np.zeros(len(self.freqs))
+
+    def __len__(self):
+        return len(self.freqs)
+
+    @staticmethod
+    def from_motors(motors):
+        bank = MotorBank(
+            [m.motor_type.value for m in motors], 
+            [m.amp for m in motors], 
+            [m.freq for m in motors]
+        )
+        bank.phases[:] = [m.phase for m in motors]
+        return bank
+
+    def __call__(self):
+        self.phases += self.freqs
+        return self.get_velocities(self.phases)
+
+    def get_velocities(self, phases):
+        pulse = self.amps * ((-1.0) ** (np.ceil(phases % (np.pi * 2)) + 1))
+        sine  = self.amps * np.sin(phases)
+        return np.where(self.motor_types == MotorType.PULSE.value, pulse, sine)
+
+    def get_schedule(self, n_steps):
+        # (n_steps, n_motors) outputs of n_steps calls from phase 0, the running sum adds the
+        # frequencies one step at a time like the phase accumulator does
+        phases = np.cumsum(np.broadcast_to(self.freqs, (n_steps, len(self))), axis = 0)
+        return self.get_velocities(phases)
+
+    def __repr__(self):
+        return f"MotorBank\nMotors\t: {len(self)}\n"
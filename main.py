@@ -7,7 +7,7 @@ dna = np.genfromtxt("./fittest_dna.csv", delimiter = ",")
 cr = creature.Creature(1)
 cr.update_dna(dna)
 
-xml_str = cr.get_robot_xml().toprettyxml()
+xml_str = cr.get_robot_urdf()
 motors  = cr.get_motors()
 
 with open('./fittest.urdf', 'w') as f:
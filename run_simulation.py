@@ -1,7 +1,7 @@
 import os
 import re
 from datetime import datetime
-from simulation import population, simulation
+from simulation import population, simulation, cache
 from simulation.log import write_log_file
 
 # Generation parameters
@@ -30,7 +30,7 @@ simlog_path = os.path.join(dir_path, f"data/{simulation_id}/log.txt")
 
 
 pop = population.Population(num_of_creatures, len_gene_init)
-sim = simulation.MultiProcessSim(num_of_processes)
+sim = simulation.MultiProcessSim(num_of_processes, cache.EvalCache(), sample_interval = 240, warm_world = True)
 
 if os.path.exists(cr_dna_path) and len(os.listdir(cr_dna_path)) > 0:
     gen_dirs  = [os.path.join(cr_dna_path, d) for d in os.listdir(cr_dna_path)]
@@ -65,7 +65,7 @@ for i in range(iter_count+1, iter_stop+1):
     )
 
     time = datetime.now().strftime("%m/%d/%Y %H:%M:%S")
-    simlog_lines.append(f"{time} Iteration: {i}")
+    simlog_lines.append(f"{time} Iteration: {i}, skipped sims: {sim.skipped_sims}")
 
     if (i) % 10 == 0:
         pop.pop_to_csvs(f"{cr_dna_path}/{simulation_id}_iter_{i}", simulation_id)
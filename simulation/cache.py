@@ -0,0 +1,87 @@
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+class EvalCache:
+    def __init__(self, max_size = 4096, base_folder = None):
+        self.max_size = max_size
+        self.base_folder = base_folder
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if base_folder is not None and not os.path.exists(base_folder):
+            os.makedirs(base_folder, exist_ok = True)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def get_key(cr, **sim_params):
+        # content address of everything that determines a simulation result
+        spec_items = sorted((key, sorted(value.items())) for key, value in cr.spec.items())
+        dna = np.ascontiguousarray(cr.dna, dtype = np.float64)
+
+        digest = hashlib.sha1()
+        digest.update(str(dna.shape).encode())
+        digest.update(dna.tobytes())
+        digest.update(repr(spec_items).encode())
+        digest.update(repr(sorted(sim_params.items())).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        path = self.__get_path(key)
+        if path is not None and os.path.exists(path):
+            # the exit reason and frame are in the header line, files without one predate them
+            with open(path) as f:
+                header = f.readline()
+            exit_reason, exit_frame = None, None
+            if header.startswith("# "):
+                exit_reason, exit_frame = header[2:].strip().split(",")
+                exit_frame = int(exit_frame)
+            positions = np.genfromtxt(path, delimiter = ",")
+            result = (tuple(map(float, positions[0])), tuple(map(float, positions[1])), exit_reason, exit_frame)
+            self.__put_memory(key, result)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        return None
+
+    def put(self, key, start_position, last_position, exit_reason = None, exit_frame = None):
+        result = (tuple(map(float, start_position)), tuple(map(float, last_position)), exit_reason, exit_frame)
+        self.__put_memory(key, result)
+
+        path = self.__get_path(key)
+        if path is not None:
+            header = "" if exit_reason is None else f"{exit_reason},{exit_frame}"
+            np.savetxt(path, np.array(result[:2]), delimiter = ",", header = header)
+
+    def lookup(self, cr, **sim_params):
+        result = self.get(EvalCache.get_key(cr, **sim_params))
+        if result is None:
+            return False
+        cr.reset_start_position(result[0])
+        cr.update_position(result[1])
+        cr.exit_reason, cr.exit_frame = result[2], result[3]
+        return True
+
+    def store(self, cr, **sim_params):
+        self.put(EvalCache.get_key(cr, **sim_params), cr.start_position, cr.last_position, cr.exit_reason, cr.exit_frame)
+
+    def __put_memory(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+
+    def __get_path(self, key):
+        if self.base_folder is None:
+            return None
+        return os.path.join(self.base_folder, f"{key}.csv")
@@ -0,0 +1,86 @@
+import math
+import pybullet as p
+from creature import creature
+
+class MultiBodyLoader:
+    # createMultiBody silently drops every joint past the 127th
+    max_links = 128
+
+    @staticmethod
+    def create_collision_shape(link_shape, shape_attrs, client_id):
+        # same geometry as the URDF written by Creature.link_to_xml, parsed from the same values
+        if link_shape == "box":
+            half_extents = [float(size) / 2 for size in shape_attrs["size"].split(" ")]
+            return p.createCollisionShape(p.GEOM_BOX, halfExtents = half_extents, physicsClientId = client_id)
+        elif link_shape == "cylinder":
+            # loadURDF turns cylinders into a 32-sided convex hull unless URDF_USE_IMPLICIT_CYLINDER is set
+            radius = float(shape_attrs["radius"])
+            half_length = float(shape_attrs["length"]) / 2
+            vertices = []
+            for i in range(32):
+                angle = 2 * math.pi * (i / 32)
+                vertices.append([radius * math.sin(angle), radius * math.cos(angle), half_length])
+                vertices.append([radius * math.sin(angle), radius * math.cos(angle), -half_length])
+            return p.createCollisionShape(p.GEOM_MESH, vertices = vertices, physicsClientId = client_id)
+        else:
+            return p.createCollisionShape(p.GEOM_SPHERE, radius = float(shape_attrs["radius"]), physicsClientId = client_id)
+
+    @staticmethod
+    def rpy_to_quaternion(roll, pitch, yaw):
+        # same arithmetic as the URDF parser, p.getQuaternionFromEuler differs in the last bits
+        phi, the, psi = roll / 2.0, pitch / 2.0, yaw / 2.0
+        quat = [
+            math.sin(phi) * math.cos(the) * math.cos(psi) - math.cos(phi) * math.sin(the) * math.sin(psi),
+            math.cos(phi) * math.sin(the) * math.cos(psi) + math.sin(phi) * math.cos(the) * math.sin(psi),
+            math.cos(phi) * math.cos(the) * math.sin(psi) - math.sin(phi) * math.sin(the) * math.cos(psi),
+            math.cos(phi) * math.cos(the) * math.cos(psi) + math.sin(phi) * math.sin(the) * math.sin(psi)
+        ]
+        inv_norm = 1.0 / math.sqrt(quat[0] * quat[0] + quat[1] * quat[1] + quat[2] * quat[2] + quat[3] * quat[3])
+        return [q * inv_norm for q in quat]
+
+    @staticmethod
+    def load_links(links, client_id, base_position = (0, 0, 0)):
+        link_indices = {}
+        masses = []
+        shapes = []
+        parent_indices = []
+        positions = []
+        orientations = []
+        axes = []
+
+        for i, link in enumerate(links):
+            link_shape, shape_attrs, link_mass = creature.Creature.link_to_geometry(link.gene_dict)
+            link_indices[link.name] = i
+            masses.append(float(link_mass))
+            shapes.append(MultiBodyLoader.create_collision_shape(link_shape, shape_attrs, client_id))
+            if i == 0:
+                continue
+
+            _, joint_axis, origin_xyz, origin_rpy = creature.Creature.link_to_joint_frame(link.name, link.gene_dict)
+            parent_indices.append(link_indices[link.parent_name])
+            positions.append([float(x) for x in origin_xyz])
+            orientations.append(MultiBodyLoader.rpy_to_quaternion(*[float(r) for r in origin_rpy]))
+            axes.append([float(a) for a in joint_axis.split(" ")])
+
+        n_joints = len(links) - 1
+        robot = p.createMultiBody(
+            baseMass = masses[0],
+            baseCollisionShapeIndex = shapes[0],
+            basePosition = base_position,
+            linkMasses = masses[1:],
+            linkCollisionShapeIndices = shapes[1:],
+            linkVisualShapeIndices = [-1] * n_joints,
+            linkPositions = positions,
+            linkOrientations = orientations,
+            linkInertialFramePositions = [[0, 0, 0]] * n_joints,
+            linkInertialFrameOrientations = [[0, 0, 0, 1]] * n_joints,
+            linkParentIndices = parent_indices,
+            linkJointTypes = [p.JOINT_REVOLUTE] * n_joints, # 'continuous' and the unlimited 'revolute' behave the same
+            linkJointAxis = axes,
+            physicsClientId = client_id
+        )
+        return robot
+
+    @staticmethod
+    def load_creature(cr, client_id, base_position = (0, 0, 0)):
+        return MultiBodyLoader.load_links(cr.get_expanded_links(), client_id, base_position)
@@ -1,82 +1,235 @@
 import copy
 import numpy as np
+from creature import creature, genome
 
 class Selection:
+    @staticmethod
+    def get_fitness_arrays(creatures):
+        starts = np.array([cr.start_position for cr in creatures], dtype = np.float64).reshape(-1, 3)
+        finishes = np.array([cr.last_position for cr in creatures], dtype = np.float64).reshape(-1, 3)
+        n_links = np.array([cr.get_expanded_link_count() for cr in creatures], dtype = np.int64)
+        return starts, finishes, n_links
+
+    @staticmethod
+    def eval_fitness_arrays(starts, finishes, n_links, dists = None):
+        if dists is None:
+            dists = creature.Creature.get_distances(starts, finishes)
+
+        reward_x  = 1 + finishes[:, 0] - starts[:, 0] / 100
+        penalty_n = 1 + np.asarray(n_links) // 2
+        # to prevent negative value of x distance 'finish[0] - start[0]'
+        fits = np.maximum(0, dists * reward_x / penalty_n)
+        return np.nan_to_num(fits, nan = 0)
+
     @staticmethod
     def eval_fitness(creatures):
-        fitness = []
-        for cr in creatures:
-            start = np.array(cr.start_position)
-            finish = np.array(cr.last_position)
-            dist = np.array(cr.get_distance())
-            n_joint = len(cr.get_expanded_links())
-
-            reward_x  = 1 + finish[0] - start[0] / 100
-            penalty_n = 1 + int(n_joint / 2)
-            # to prevent negative value of x distance 'finish[0] - start[0]'
-            fit = np.maximum(0, dist * reward_x / penalty_n)  
-            fit = np.nan_to_num(fit, nan = 0)
-            fitness.append(fit)
-        return np.array(fitness)
-
-    @staticmethod
-    def select_parent_indices(fits):
+        return Selection.eval_fitness_arrays(*Selection.get_fitness_arrays(creatures))
+
+    @staticmethod
+    def select_parent_indices(fits, rng = None):
+        rng = np.random.default_rng(rng)
         fits  = np.nan_to_num(np.array(fits), nan = 0.0)
         probs = fits / np.sum(fits)
         if np.mean(probs == 0.0) == 1:
             probs = np.ones(len(fits)) / len(fits)
-        return np.random.choice(range(len(fits)), 2, False, probs)
+        return rng.choice(range(len(fits)), 2, False, probs)
+
+    @staticmethod
+    def select_parent_index_pairs(fits, n_pairs, rng = None):
+        # n_pairs draws of select_parent_indices at once: roulette for the first parent,
+        # roulette over the others for the second one
+        rng = np.random.default_rng(rng)
+        weights = np.nan_to_num(np.array(fits, dtype = np.float64), nan = 0.0)
+        if np.count_nonzero(weights > 0) < 2:
+            weights = np.ones(len(weights))
+        cdf = np.cumsum(weights)
+        cdf_before = cdf - weights
+        total = cdf[-1]
+        last = np.flatnonzero(weights)[-1]
+
+        first = np.minimum(np.searchsorted(cdf, rng.random(n_pairs) * total, side = "right"), last)
+        first_weights = weights[first]
+        # draw from the line with the first parent's interval cut out, then map back onto it
+        targets = rng.random(n_pairs) * (total - first_weights)
+        targets += first_weights * (targets >= cdf_before[first])
+        second = np.minimum(np.searchsorted(cdf, targets, side = "right"), last)
+        return np.stack((first, second), axis = 1)
 
     @staticmethod
-    def select_parents(creatures, fits = None):
+    def select_parents(creatures, fits = None, rng = None):
         if fits is None:
             fits = Selection.eval_fitness(creatures)
-        id1, id2 = Selection.select_parent_indices(fits)
+        id1, id2 = Selection.select_parent_indices(fits, rng)
         return creatures[id1], creatures[id2]
 
 class Crossover:
     @staticmethod
-    def crossover_dna(parent_dna_1, parent_dna_2, max_length_limit = 15, max_growth_rate = 1.2):
+    def crossover_dna(parent_dna_1, parent_dna_2, max_length_limit = 15, max_growth_rate = 1.2, rng = None):
+        rng = np.random.default_rng(rng)
         growth_limit = int(np.maximum(len(parent_dna_1), len(parent_dna_2)) * max_growth_rate)
         length_limit = np.minimum(growth_limit, max_length_limit)
-        ind_1 = np.random.randint(1, len(parent_dna_1)+1)
-        ind_2 = np.random.randint(0, len(parent_dna_2))
+        ind_1 = rng.integers(1, len(parent_dna_1)+1)
+        ind_2 = rng.integers(0, len(parent_dna_2))
         child = np.concatenate((parent_dna_1[:ind_1], parent_dna_2[ind_2:]))
         return child[:length_limit]
 
+    @staticmethod
+    def crossover_batch(stacked, lengths, parent_pairs, max_length_limit = 15, max_growth_rate = 1.2, rng = None):
+        # crossover_dna for every pair, parents are rows of a zero-padded (n, max_genes, gene_length) stack
+        rng = np.random.default_rng(rng)
+        lengths = np.asarray(lengths)
+        ids_1, ids_2 = np.asarray(parent_pairs).T
+        len_1, len_2 = lengths[ids_1], lengths[ids_2]
+        growth_limit = (np.maximum(len_1, len_2) * max_growth_rate).astype(np.int64)
+        length_limit = np.minimum(growth_limit, max_length_limit)
+        ind_1 = rng.integers(1, len_1 + 1)
+        ind_2 = rng.integers(0, len_2)
+        child_lengths = np.minimum(ind_1 + len_2 - ind_2, length_limit)
+
+        cols = np.arange(np.max(child_lengths))
+        from_1 = cols < ind_1[:, None]
+        rows = np.where(from_1, cols, cols - ind_1[:, None] + ind_2[:, None])
+        parents = np.where(from_1, ids_1[:, None], ids_2[:, None])
+        children = stacked[parents, np.minimum(rows, stacked.shape[1] - 1)]
+        children[cols >= child_lengths[:, None]] = 0
+        return children, child_lengths
+
 class Mutation:
     @staticmethod
-    def point_mutate(dna, mutation_rate = .05, mutation_amount = .05):
+    def point_mutate(dna, mutation_rate = .05, mutation_amount = .05, rng = None):
+        rng = np.random.default_rng(rng)
         cp_dna = copy.copy(dna).flatten()
-        mutated = np.random.choice((True, False), size = len(cp_dna), replace = True, p = (mutation_rate, 1-mutation_rate))
+        mutated = rng.choice((True, False), size = len(cp_dna), replace = True, p = (mutation_rate, 1-mutation_rate))
         cp_dna[mutated] = np.maximum(
             0.0001,
             np.minimum(
                 0.999,
-                cp_dna[mutated] + np.random.random() * mutation_amount * (-1) ** np.random.randint(1, 3)
+                cp_dna[mutated] + rng.random() * mutation_amount * (-1) ** rng.integers(1, 3)
             )
         )
         mutated_dna = np.reshape(cp_dna, dna.shape)
         return mutated_dna
 
     @staticmethod
-    def shrink_mutate(dna, min_length_limit = 2, mutation_rate = .05):
+    def shrink_mutate(dna, min_length_limit = 2, mutation_rate = .05, rng = None):
+        rng = np.random.default_rng(rng)
         cp_dna = copy.copy(dna)
         if len(cp_dna) <= min_length_limit:
             return cp_dna
-        mutated = np.random.choice((True, False), size = len(cp_dna), replace = True, p = (mutation_rate, 1-mutation_rate))
+        mutated = rng.choice((True, False), size = len(cp_dna), replace = True, p = (mutation_rate, 1-mutation_rate))
         mutated_dna = np.delete(cp_dna, mutated, axis = 0)
         if len(mutated_dna) < min_length_limit:
             return cp_dna[:2]
         return mutated_dna
 
     @staticmethod
-    def grow_mutate(dna, max_length_limit = 15, mutation_rate = .05):
+    def grow_mutate(dna, max_length_limit = 15, mutation_rate = .05, rng = None):
+        rng = np.random.default_rng(rng)
         cp_dna = copy.copy(dna)
-        mutated = np.random.choice((True, False), size = len(cp_dna), replace = True, p = (mutation_rate, 1-mutation_rate))
+        mutated = rng.choice((True, False), size = len(cp_dna), replace = True, p = (mutation_rate, 1-mutation_rate))
         mutated_dna = np.append(cp_dna, cp_dna[mutated], axis = 0)
         return mutated_dna[:max_length_limit]
 
+    @staticmethod
+    def point_mutate_batch(children, lengths, mutation_rate = .05, mutation_amount = .05, rng = None):
+        # point_mutate for every child of a zero-padded stack, one mutation amount per child
+        rng = np.random.default_rng(rng)
+        n_children = len(children)
+        valid = np.arange(children.shape[1]) < np.asarray(lengths)[:, None]
+        mutated = (rng.random(children.shape) < mutation_rate) & valid[..., None]
+        amounts = rng.random(n_children) * mutation_amount * (-1) ** rng.integers(1, 3, size = n_children)
+        mutated_values = np.maximum(0.0001, np.minimum(0.999, children + amounts[:, None, None]))
+        return np.where(mutated, mutated_values, children)
+
+    @staticmethod
+    def shrink_mutate_batch(children, lengths, min_length_limit = 2, mutation_rate = .05, rng = None):
+        rng = np.random.default_rng(rng)
+        lengths = np.asarray(lengths)
+        cols = np.arange(children.shape[1])
+        valid = cols < lengths[:, None]
+        shrinkable = lengths > min_length_limit
+        kept = valid & ~((rng.random(valid.shape) < mutation_rate) & shrinkable[:, None])
+        # like shrink_mutate, children left too short keep their first two genes
+        too_short = shrinkable & (np.sum(kept, axis = 1) < min_length_limit)
+        kept[too_short] = cols < 2
+
+        order = np.argsort(~kept, axis = 1, kind = "stable")
+        children = np.take_along_axis(children, order[..., None], axis = 1)
+        new_lengths = np.sum(kept, axis = 1)
+        children[cols >= new_lengths[:, None]] = 0
+        return children, new_lengths
+
+    @staticmethod
+    def grow_mutate_batch(children, lengths, max_length_limit = 15, mutation_rate = .05, rng = None):
+        rng = np.random.default_rng(rng)
+        lengths = np.asarray(lengths)
+        width = children.shape[1]
+        valid = np.arange(width) < lengths[:, None]
+        copied = (rng.random(valid.shape) < mutation_rate) & valid
+        new_lengths = np.minimum(lengths + np.sum(copied, axis = 1), max_length_limit)
+
+        # copied genes are appended in their original order
+        cols = np.arange(np.max(new_lengths))
+        copied_rows = np.argsort(~copied, axis = 1, kind = "stable")
+        extra = np.clip(cols - lengths[:, None], 0, width - 1)
+        rows = np.where(cols < lengths[:, None], np.minimum(cols, width - 1), np.take_along_axis(copied_rows, extra, axis = 1))
+        children = np.take_along_axis(children, rows[..., None], axis = 1)
+        children[cols >= new_lengths[:, None]] = 0
+        return children, new_lengths
+
+class ExpansionBudget:
+    __policies = ("reject", "repair", "truncate")
+
+    def __init__(self, max_links = 1000, policy = "repair", spec = None, max_retries = 100):
+        assert policy in ExpansionBudget.__policies, f"Invalid expansion budget policy '{policy}'"
+        assert max_links >= 1
+        assert max_retries >= 0
+        self.max_links = max_links
+        self.policy = policy
+        self.max_retries = max_retries # rejected children bred again before one is truncated instead
+        self.spec = genome.GeneSpec.get_gene_spec() if spec is None else spec
+        self.fired = 0
+
+    def count_links(self, dna):
+        return creature.Creature.count_expanded_links(dna, self.spec)
+
+    def apply(self, dna, policy = None):
+        if self.count_links(dna) <= self.max_links:
+            return dna
+        self.fired += 1
+        policy = self.policy if policy is None else policy
+        if policy == "reject":
+            return None
+        elif policy == "repair":
+            return self.repair(dna)
+        return self.truncate(dna)
+
+    def repair(self, dna):
+        # lower recurrences from the deepest gene up, it changes the fewest expanded links per step
+        rec_spec = self.spec["link_recurrence"]
+        recurs = creature.Creature.get_recurrences(dna, self.spec)
+        repaired_dna = copy.copy(dna)
+        for i in range(len(recurs) - 1, 0, -1):
+            while recurs[i] > 1 and creature.Creature.count_links(recurs) > self.max_links:
+                recurs[i] -= 1
+                repaired_dna[i, rec_spec["index"]] = (recurs[i] - 0.5) / rec_spec["scale"]
+        return self.truncate(repaired_dna)
+
+    def apply_batch(self, children, lengths):
+        # link counts of a zero-padded stack in one pass, only the children over budget go through apply
+        counts = creature.Creature.count_expanded_links_padded(children, lengths, self.spec)
+        return [
+            child[:n] if count <= self.max_links else self.apply(child[:n])
+            for child, n, count in zip(children, lengths, counts)
+        ]
+
+    def truncate(self, dna):
+        recurs = creature.Creature.get_recurrences(dna, self.spec)
+        n_genes = len(recurs)
+        while n_genes > 1 and creature.Creature.count_links(recurs[:n_genes]) > self.max_links:
+            n_genes -= 1
+        return dna[:n_genes]
+
 class NewGeneration:
     @staticmethod
     def generate_child_dna(
@@ -88,10 +241,45 @@ class NewGeneration:
         point_mutation_rate = .05,
         point_mutation_amount = .05,
         shrink_mutation_rate = .05,
-        grow_mutation_rate = .05
+        grow_mutation_rate = .05,
+        expansion_budget = None,
+        rng = None
     ):
-        child_dna = Crossover.crossover_dna(parent_dna_1, parent_dna_2, max_length_limit, max_growth_rate)
-        child_dna = Mutation.point_mutate(child_dna, point_mutation_rate, point_mutation_amount)
-        child_dna = Mutation.shrink_mutate(child_dna, min_length_limit, shrink_mutation_rate)
-        child_dna = Mutation.grow_mutate(child_dna, max_length_limit, grow_mutation_rate) 
+        # every gene is at least one link, a budget below min_length_limit cannot be met
+        assert expansion_budget is None or expansion_budget.max_links >= min_length_limit
+        rng = np.random.default_rng(rng)
+        child_dna = Crossover.crossover_dna(parent_dna_1, parent_dna_2, max_length_limit, max_growth_rate, rng)
+        child_dna = Mutation.point_mutate(child_dna, point_mutation_rate, point_mutation_amount, rng)
+        child_dna = Mutation.shrink_mutate(child_dna, min_length_limit, shrink_mutation_rate, rng)
+        child_dna = Mutation.grow_mutate(child_dna, max_length_limit, grow_mutation_rate, rng) 
+        if expansion_budget is not None:
+            child_dna = expansion_budget.apply(child_dna)
         return child_dna
+
+    @staticmethod
+    def generate_children_dna(
+        parent_dnas, 
+        parent_pairs, 
+        min_length_limit = 2, 
+        max_length_limit = 15, 
+        max_growth_rate = 1.2,
+        point_mutation_rate = .05,
+        point_mutation_amount = .05,
+        shrink_mutation_rate = .05,
+        grow_mutation_rate = .05,
+        expansion_budget = None,
+        rng = None
+    ):
+        # generate_child_dna for every pair at once over the zero-padded parent genomes
+        assert expansion_budget is None or expansion_budget.max_links >= min_length_limit
+        if len(parent_pairs) == 0:
+            return []
+        rng = np.random.default_rng(rng)
+        stacked, lengths = genome.Genome.stack_genomes(parent_dnas)
+        children, lengths = Crossover.crossover_batch(stacked, lengths, parent_pairs, max_length_limit, max_growth_rate, rng)
+        children = Mutation.point_mutate_batch(children, lengths, point_mutation_rate, point_mutation_amount, rng)
+        children, lengths = Mutation.shrink_mutate_batch(children, lengths, min_length_limit, shrink_mutation_rate, rng)
+        children, lengths = Mutation.grow_mutate_batch(children, lengths, max_length_limit, grow_mutation_rate, rng)
+        if expansion_budget is not None:
+            return expansion_budget.apply_batch(children, lengths)
+        return [child[:n] for child, n in zip(children, lengths)]
@@ -1,41 +1,47 @@
 import os
 import re
+import json
 import numpy as np
 from creature import creature, genome
-from simulation import manipulation
+from simulation import manipulation, population_arrays
 
 class Population:
-    def __init__(self, population_size, gene_count = 5):
+    def __init__(self, population_size, gene_count = 5, rng = None):
         self.gene_count = gene_count
         self.population_size = population_size
         self.creatures = []
+        self.arrays = None
+        self.generation = 0
         self.best_score = 0
+        self.rng = np.random.default_rng(rng)
 
         self.reset_population()
 
     def add_creature(self, cr):
-        self.creatures.append(cr)
+        self.reset_population(self.creatures + [cr])
 
     def reset_population(self, creatures = None):
+        # the state is kept in one PopulationArrays, self.creatures are views of its rows
         if creatures == None:
-            self.creatures = [creature.Creature(self.gene_count) for _ in range(self.population_size)]
+            creatures = [creature.Creature(self.gene_count, rng = self.rng) for _ in range(self.population_size)]
         else:
             assert type(creatures) == list and len(creatures) > 0
-            assert type(creatures[0]) == creature.Creature
+            assert isinstance(creatures[0], creature.Creature)
             for old_creature in self.creatures:
                 del old_creature
-            self.creatures = creatures
+        self.arrays = population_arrays.PopulationArrays.from_creatures(creatures, self.generation)
+        self.creatures = self.arrays.to_creatures()
 
     def reset_population_random_length(self):
         assert self.gene_count >= 3
         new_creatures = []
         for _ in range(self.population_size):
-            new_creatures.append(creature.Creature(np.random.randint(2, self.gene_count)))
+            new_creatures.append(creature.Creature(self.rng.integers(2, self.gene_count), rng = self.rng))
         self.reset_population(new_creatures)
 
     def select_parents(self):
-        fits = manipulation.Selection.eval_fitness(self.creatures)
-        return manipulation.Selection.select_parents(self.creatures, fits)
+        fits = self.arrays.eval_fitness()
+        return manipulation.Selection.select_parents(self.creatures, fits, self.rng)
 
     def reset_population_new_gen(
             self, 
@@ -47,7 +53,8 @@ class Population:
             point_mutation_rate = .05,
             point_mutation_amount = .05,
             shrink_mutation_rate = .05,
-            grow_mutation_rate = .05
+            grow_mutation_rate = .05,
+            expansion_budget = None
         ):
         if num_elites < self.population_size :
             num_elites = 0
@@ -57,45 +64,81 @@ class Population:
             num_elites = int(self.population_size / 2)
             num_new_random = np.maximum(0, self.population_size - num_elites)
         
-        fits = manipulation.Selection.eval_fitness(self.creatures)
+        fits = self.arrays.eval_fitness()
         fittest_indices = np.array(fits).argsort()[-1:-(num_elites+1):-1] # find n argmax, based on NPE, 2011, https://stackoverflow.com/a/6910672
 
         new_creatures = []
         for index in fittest_indices:
             fittest_cr = self.creatures[index]
             new_creatures.append(fittest_cr)
-        for _ in range(self.population_size - num_elites - num_new_random):
-            p1, p2 = self.select_parents()
-            child_dna = manipulation.NewGeneration.generate_child_dna(
-                p1.dna, 
-                p2.dna,
-                min_length_limit,
-                max_length_limit,
-                max_growth_rate,
-                point_mutation_rate,
-                point_mutation_amount,
-                shrink_mutation_rate,
-                grow_mutation_rate
-            )
-            child_cr = creature.Creature(1)
+        # fitness is evaluated once and every child is bred in one batch
+        parent_pairs = manipulation.Selection.select_parent_index_pairs(fits, self.population_size - num_elites - num_new_random, self.rng)
+        children_dna = manipulation.NewGeneration.generate_children_dna(
+            [cr.dna for cr in self.creatures],
+            parent_pairs,
+            min_length_limit,
+            max_length_limit,
+            max_growth_rate,
+            point_mutation_rate,
+            point_mutation_amount,
+            shrink_mutation_rate,
+            grow_mutation_rate,
+            expansion_budget,
+            self.rng
+        )
+        for child_dna in children_dna:
+            n_retries = 0
+            while child_dna is None: # rejected by the expansion budget, breed from other parents
+                n_retries += 1
+                # past max_retries the child is bred without the budget and truncated to it instead
+                budget = expansion_budget if n_retries <= expansion_budget.max_retries else None
+                id1, id2 = manipulation.Selection.select_parent_index_pairs(fits, 1, self.rng)[0]
+                child_dna = manipulation.NewGeneration.generate_child_dna(
+                    self.creatures[id1].dna, 
+                    self.creatures[id2].dna,
+                    min_length_limit,
+                    max_length_limit,
+                    max_growth_rate,
+                    point_mutation_rate,
+                    point_mutation_amount,
+                    shrink_mutation_rate,
+                    grow_mutation_rate,
+                    budget,
+                    self.rng
+                )
+                if budget is None:
+                    child_dna = expansion_budget.apply(child_dna, "truncate")
+            child_cr = creature.Creature(1, rng = self.rng)
             child_cr.update_dna(child_dna)
             new_creatures.append(child_cr)
         for _ in range(num_new_random):
-            random_cr = creature.Creature(self.gene_count)
+            random_cr = creature.Creature(self.gene_count, rng = self.rng)
             new_creatures.append(random_cr)
         assert self.population_size == len(new_creatures)
 
+        self.generation += 1
         self.reset_population(new_creatures)   
 
     def pop_to_csvs(self, base_folder = ".", identifier = "dna"):
         Population.__to_csvs(self.creatures, base_folder = base_folder, identifier = identifier)
+        # the random state is part of the checkpoint so a resumed run draws the same numbers
+        with open(os.path.join(base_folder, f"{identifier}_rng.json"), "w") as f:
+            json.dump(self.rng.bit_generator.state, f)
 
     def pop_from_csvs(self, base_folder = ".", identifier = "dna"):
         new_creatures = Population.__from_csvs(base_folder = base_folder, identifier = identifier)
         self.reset_population(new_creatures)
 
+        rng_path = os.path.join(base_folder, f"{identifier}_rng.json")
+        if os.path.exists(rng_path):
+            with open(rng_path) as f:
+                state = json.load(f)
+            bit_generator = getattr(np.random, state["bit_generator"])()
+            bit_generator.state = state
+            self.rng = np.random.Generator(bit_generator)
+
     def get_fittest_creatures(self, n_fittest = 3):
-        fits = manipulation.Selection.eval_fitness(self.creatures)
+        fits = self.arrays.eval_fitness()
         fittest_ids = fits.argsort()[-n_fittest:][::-1] # find n argmax, based on NPE, 2011, https://stackoverflow.com/a/6910672
         fittest_crs = [self.creatures[id] for id in fittest_ids]
         return fittest_crs
@@ -126,10 +169,13 @@ class Population:
         return new_creatures
 
     def generate_pop_report(self, generation, base_folder = "."):
-        n_exp_link  = [len(cr.get_expanded_links()) for cr in self.creatures]
+        dist_arr = creature.Creature.get_distances(self.arrays.starts, self.arrays.finishes)
+        fit_arr  = manipulation.Selection.eval_fitness_arrays(self.arrays.starts, self.arrays.finishes, self.arrays.n_links, dist_arr)
+
+        n_exp_link  = self.arrays.n_links.tolist()
         n_flat_link = [len(cr.get_flat_links()) for cr in self.creatures]
-        dists = [cr.get_distance() for cr in self.creatures]
-        fits  = list(manipulation.Selection.eval_fitness(self.creatures))
+        dists = list(dist_arr)
+        fits  = list(fit_arr)
 
         file_names = [
             f"{generation}_n_exp_links.csv",
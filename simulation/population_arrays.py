@@ -0,0 +1,147 @@
+import numpy as np
+from creature import creature, genome
+from simulation import manipulation
+
+class PopulationArrays:
+    # struct-of-arrays storage of a population, Population keeps its state here and serves its
+    # creatures as views. every genome lives in one (total_genes, gene_length) buffer,
+    # creature i owns the rows genes[offsets[i]:offsets[i] + lengths[i]]
+    row_keys = ("starts", "finishes", "fitness", "exit_reasons", "exit_frames", "physics_profiles")
+
+    def __init__(self, genes, lengths, gene_spec = genome.GeneSpec.get_gene_spec(), generations = None):
+        lengths = np.asarray(lengths, dtype = np.int64)
+        genes = np.ascontiguousarray(genes, dtype = np.float64)
+        assert genes.ndim == 2 and genes.shape[-1] == len(gene_spec)
+        assert len(lengths) > 0 and np.all(lengths > 0) and lengths.sum() == len(genes)
+
+        n_creatures = len(lengths)
+        self.spec = gene_spec
+        self.genes = genes
+        self.lengths = lengths
+        self.offsets = np.cumsum(lengths) - lengths
+        self.starts = np.zeros((n_creatures, 3))
+        self.finishes = np.zeros((n_creatures, 3))
+        self.fitness = np.zeros(n_creatures)
+        self.exit_reasons = np.full(n_creatures, None, dtype = object)
+        self.exit_frames = np.full(n_creatures, None, dtype = object)
+        self.physics_profiles = np.full(n_creatures, None, dtype = object)
+        self.n_links = PopulationArrays.count_expanded_links(genes, lengths, gene_spec)
+        if generations is None:
+            generations = np.zeros(n_creatures, dtype = np.int64)
+        self.generations = np.asarray(generations, dtype = np.int64)
+        assert self.generations.shape == (n_creatures,)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @staticmethod
+    def from_creatures(creatures, generation = 0):
+        # views keep the generation they were born in, other creatures get the given one
+        assert type(creatures) == list and len(creatures) > 0
+        spec = creatures[0].spec
+        assert all(cr.spec == spec for cr in creatures)
+
+        arrays = PopulationArrays(
+            np.concatenate([np.atleast_2d(cr.dna) for cr in creatures]),
+            [len(np.atleast_2d(cr.dna)) for cr in creatures],
+            spec,
+            [cr.generation if isinstance(cr, CreatureView) else generation for cr in creatures]
+        )
+        arrays.update_rows(creatures)
+        return arrays
+
+    @staticmethod
+    def count_expanded_links(genes, lengths, spec):
+        # Creature.count_links for every creature, the flat recurrences are padded per creature
+        recurs = genome.GeneSpec.compile_spec(spec).decode_key(genes, "link_recurrence")
+        mask = np.arange(np.max(lengths)) < lengths[:, None]
+        padded = np.ones(mask.shape, dtype = np.int64)
+        padded[mask] = recurs
+        return creature.Creature.count_links_padded(padded, lengths)
+
+    def get_dna(self, index):
+        offset = self.offsets[index]
+        return self.genes[offset:offset + self.lengths[index]]
+
+    def set_dna(self, index, dna):
+        # the buffer is shared, a genome can change its genes but not its length
+        dna = np.atleast_2d(dna)
+        assert dna.shape == (self.lengths[index], len(self.spec)), "a creature view cannot change its gene count"
+        self.get_dna(index)[:] = dna
+        self.n_links[index] = creature.Creature.count_expanded_links(dna, self.spec)
+
+    def get_creature(self, index):
+        return CreatureView(self, index)
+
+    def to_creatures(self):
+        return [self.get_creature(i) for i in range(len(self))]
+
+    def take(self, indices):
+        # the rows of the given creatures in a new buffer, what is sent to the simulation workers
+        indices = np.asarray(indices, dtype = np.int64)
+        arrays = PopulationArrays(
+            np.concatenate([self.get_dna(i) for i in indices]),
+            self.lengths[indices],
+            self.spec,
+            self.generations[indices]
+        )
+        for key in PopulationArrays.row_keys:
+            getattr(arrays, key)[:] = getattr(self, key)[indices]
+        return arrays
+
+    def put(self, indices, arrays):
+        # results of a take() copied back, the genomes are left as they are
+        indices = np.asarray(indices, dtype = np.int64)
+        assert len(indices) == len(arrays)
+        for key in PopulationArrays.row_keys:
+            getattr(self, key)[indices] = getattr(arrays, key)
+
+    def update_rows(self, creatures):
+        assert len(creatures) == len(self)
+        self.starts[:] = [cr.start_position for cr in creatures]
+        self.finishes[:] = [cr.last_position for cr in creatures]
+        for i, cr in enumerate(creatures):
+            self.exit_reasons[i] = cr.exit_reason
+            self.exit_frames[i] = cr.exit_frame
+            self.physics_profiles[i] = cr.physics_profile
+
+    def eval_fitness(self):
+        self.fitness[:] = manipulation.Selection.eval_fitness_arrays(self.starts, self.finishes, self.n_links)
+        return self.fitness
+
+def get_row_property(key):
+    return property(
+        lambda self: getattr(self.arrays, key)[self.index],
+        lambda self, value: getattr(self.arrays, key).__setitem__(self.index, value)
+    )
+
+def get_position_property(key):
+    return property(
+        lambda self: tuple(getattr(self.arrays, key)[self.index].tolist()),
+        lambda self, value: getattr(self.arrays, key).__setitem__(self.index, value)
+    )
+
+class CreatureView(creature.Creature):
+    # a creature whose genome, positions and exit fields are a row of PopulationArrays, links and
+    # motors are decoded and cached per view like for any other creature
+    dna = property(
+        lambda self: self.arrays.get_dna(self.index),
+        lambda self, dna: self.arrays.set_dna(self.index, dna)
+    )
+    start_position = get_position_property("starts")
+    last_position = get_position_property("finishes")
+    exit_reason = get_row_property("exit_reasons")
+    exit_frame = get_row_property("exit_frames")
+    physics_profile = get_row_property("physics_profiles")
+    generation = property(lambda self: int(self.arrays.generations[self.index]))
+
+    def __init__(self, arrays, index):
+        # Creature.__init__ would reset the row, only the per view caches are set here
+        self.arrays = arrays
+        self.index = index
+        self.spec = arrays.spec
+        self.motors = None
+        self.motor_bank = None
+        self._Creature__flat_links = None
+        self._Creature__expanded_links = None
+        self._Creature__control_schedule = None
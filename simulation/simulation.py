@@ -1,86 +1,514 @@
 import os
+import math
+import time
+import numpy as np
 import pybullet as p
+from collections import Counter, deque
+from dataclasses import dataclass
 from multiprocessing import Pool
+from simulation import cache, loader, manipulation
 
 class Simulation:
-    def __init__(self, sim_id = 0):
+    def __init__(self, sim_id = 0, use_urdf = False, sample_interval = 1, warm_world = False, warm_world_runs = 200):
+        assert sample_interval >= 1
         self.client_id = p.connect(p.DIRECT)
         self.sim_id = sim_id
+        self.use_urdf = use_urdf
+        self.sample_interval = sample_interval
+        self.warm_world = warm_world
+        self.warm_world_runs = warm_world_runs
+        self.world_runs = 0
+        self.robots = []
+
+    def reset_world(self):
+        client_id = self.client_id
+        p.resetSimulation(physicsClientId = client_id)
+        p.setPhysicsEngineParameter(enableFileCaching = 0, physicsClientId = client_id)
+        p.setGravity(0, 0, -10, physicsClientId = client_id)
+
+        plane_shape = p.createCollisionShape(p.GEOM_PLANE, physicsClientId = client_id)
+        plane = p.createMultiBody(plane_shape, plane_shape, physicsClientId = client_id)
+        self.world_runs = 0
+        self.robots = []
+        return plane
+
+    def clear_world(self):
+        # a warm world keeps the plane and the engine settings and only removes the last robots,
+        # pybullet never frees the robots' collision shapes so it is still reset every warm_world_runs
+        if not self.warm_world or len(self.robots) == 0 or self.world_runs >= self.warm_world_runs:
+            self.reset_world()
+        else:
+            for robot in self.robots:
+                p.removeBody(robot, physicsClientId = self.client_id)
+            self.robots = []
+        self.world_runs += 1
+
+    def run_creature(self, cr, filename = "robot.urdf", max_frame = 2400, early_exit = None, profile = None):
+        self.run_creatures([cr], filename, max_frame, early_exit, profile = profile)
+
+    def load_robot(self, cr, filename):
+        use_urdf = self.use_urdf or cr.get_expanded_link_count() > loader.MultiBodyLoader.max_links
+        if not use_urdf:
+            return loader.MultiBodyLoader.load_creature(cr, self.client_id)
 
-    def run_creature(self, cr, filename = "robot.urdf", max_frame = 2400):
         if not os.path.exists(".temp/urdf"):
             os.makedirs(".temp/urdf")
-
         cr_xml_path = ".temp/urdf/sim_" + str(self.sim_id) + "_" + filename
         cr.write_robot_xml(cr_xml_path)
+        return p.loadURDF(cr_xml_path, physicsClientId = self.client_id)
 
+    def run_creatures(self, creatures, filename = "robot.urdf", max_frame = 2400, early_exit = None, profile = None, spacing = 20):
+        # every creature of a batch shares one world and one stepSimulation call, the robots sit
+        # spacing apart on the x axis and only collide with the plane, a batch of one is a plain run
+        profile = self.__start_world(early_exit, profile)
+        max_frame = profile.get_max_frame(max_frame)
         client_id = self.client_id
 
-        p.resetSimulation(physicsClientId = client_id)
-        p.setPhysicsEngineParameter(enableFileCaching = 0, physicsClientId = client_id)
-        p.setGravity(0, 0, -10, physicsClientId = client_id)
+        runs = []
+        for k, cr in enumerate(creatures):
+            robot = self.load_robot(cr, str(k) + "_" + filename if len(creatures) > 1 else filename)
+            self.robots.append(robot)
 
-        plane_shape = p.createCollisionShape(p.GEOM_PLANE, physicsClientId = client_id)
-        plane = p.createMultiBody(plane_shape, plane_shape, physicsClientId = client_id)
-        robot = p.loadURDF(cr_xml_path, physicsClientId = client_id)
+            offset = (k * spacing, 0, 0)
+            p.resetBasePositionAndOrientation(robot, (offset[0], 0, 3), (0, 0, 0, 1), physicsClientId = client_id)
+            if len(creatures) > 1:
+                # the plane is in the static filter group 2, robots stay in group 1 but stop colliding with it
+                for link in range(-1, p.getNumJoints(robot, physicsClientId = client_id)):
+                    p.setCollisionFilterGroupMask(robot, link, 1, 2, physicsClientId = client_id)
+            runs.append(Simulation.__get_run(cr, robot, offset, max_frame))
 
+        self.__step_runs(runs, max_frame, early_exit, profile)
+
+    def run_variants(self, creatures, filename = "robot.urdf", max_frame = 2400, early_exit = None, profile = None, settle_frames = 0):
+        # controller variants of one morphology: the body is loaded and dropped for settle_frames once,
+        # every variant starts from the saved state, without settling the results match run_creature
+        key = creatures[0].get_morphology_key()
+        assert all(cr.get_morphology_key() == key for cr in creatures), "creatures must share one morphology"
+        profile = self.__start_world(early_exit, profile)
+        max_frame = profile.get_max_frame(max_frame)
+        client_id = self.client_id
+
+        robot = self.load_robot(creatures[0], filename)
+        self.robots.append(robot)
         p.resetBasePositionAndOrientation(robot, (0, 0, 3), (0, 0, 0, 1), physicsClientId = client_id)
+        for _ in range(settle_frames // profile.frame_stride):
+            p.stepSimulation(physicsClientId = client_id)
+
+        state_id = p.saveState(physicsClientId = client_id)
+        for cr in creatures:
+            p.restoreState(stateId = state_id, physicsClientId = client_id)
+            self.__step_runs([Simulation.__get_run(cr, robot, (0, 0, 0), max_frame)], max_frame, early_exit, profile)
+        p.removeState(state_id, physicsClientId = client_id)
 
-        for i in range(max_frame):
-            if i % 240 == 0:
-                for joint_id, joint_motor in enumerate(cr.get_motors()):
-                    p.setJointMotorControl2(
-                        robot, 
-                        joint_id, 
+    def __start_world(self, early_exit, profile):
+        if profile is None:
+            profile = PhysicsProfile()
+        assert early_exit is None or early_exit.check_interval % profile.frame_stride == 0
+
+        self.clear_world()
+        p.setPhysicsEngineParameter(
+            fixedTimeStep = profile.frame_stride / 240, 
+            numSolverIterations = profile.solver_iterations, 
+            physicsClientId = self.client_id
+        )
+        return profile
+
+    @staticmethod
+    def __get_run(cr, robot, offset, max_frame):
+        # the open-loop control is replayed from the schedule, reruns start from the same phase
+        joint_ids = list(range(len(cr.get_motors())))
+        return {
+            "creature": cr,
+            "robot": robot,
+            "offset": offset,
+            "schedule": cr.get_control_schedule(max_frame).tolist(),
+            "joint_ids": joint_ids,
+            "forces": [5] * len(joint_ids),
+            "checked_positions": [],
+            "last_position": (0, 0, 0),
+        }
+
+    def __step_runs(self, runs, max_frame, early_exit, profile):
+        client_id = self.client_id
+        stride = profile.frame_stride
+        frame = 0
+        active = list(runs)
+        while frame < max_frame and len(active) > 0:
+            if frame % 240 == 0:
+                for run in active:
+                    if len(run["joint_ids"]) == 0:
+                        continue
+                    p.setJointMotorControlArray(
+                        run["robot"], 
+                        run["joint_ids"], 
                         controlMode = p.VELOCITY_CONTROL, 
-                        targetVelocity = joint_motor(),
-                        force = 5, 
+                        targetVelocities = run["schedule"][frame // 240],
+                        forces = run["forces"], 
                         physicsClientId = client_id
                     )
-            p.stepSimulation(physicsClientId = client_id)
+            # the base position is only read every sample_interval frames, at control updates,
+            # at early-exit checks and on the last frame, the steps in between are the same
+            n_frames = min(self.sample_interval - frame % self.sample_interval, 240 - frame % 240, max_frame - frame)
+            if early_exit is not None:
+                n_frames = min(n_frames, early_exit.check_interval - frame % early_exit.check_interval)
+            n_steps = max(1, n_frames // stride)
+            for _ in range(n_steps):
+                p.stepSimulation(physicsClientId = client_id)
+            frame += n_steps * stride
+
+            for run in list(active):
+                exit_reason = self.__sample_run(run, frame, max_frame, early_exit)
+                if exit_reason is not None:
+                    # finished robots leave the world so the others stop paying for them
+                    run["creature"].exit_reason, run["creature"].exit_frame = exit_reason, frame
+                    active.remove(run)
+                    if len(active) > 0:
+                        p.removeBody(run["robot"], physicsClientId = client_id)
+                        self.robots.remove(run["robot"])
+
+        for run in runs:
+            cr = run["creature"]
+            cr.update_position(run["last_position"])
+            cr.physics_profile = profile.name
+            if run in active:
+                cr.exit_reason, cr.exit_frame = "max_frame", frame
+
+    def __sample_run(self, run, frame, max_frame, early_exit):
+        # Sometimes PyBullet returns an error doing this part
+        try:
+            position, orientation = p.getBasePositionAndOrientation(run["robot"], physicsClientId = self.client_id)
+        except:
+            run["last_position"] = (0, 0, 0)
+            return "error"
+        if position[2] > 100:
+            run["last_position"] = (0, 0, 0)
+            return "escape"
+
+        offset = run["offset"]
+        last_position = (position[0] - offset[0], position[1] - offset[1], position[2] - offset[2])
+        run["last_position"] = last_position
+
+        if early_exit is not None and frame % early_exit.check_interval == 0:
+            run["checked_positions"].append(last_position)
+            return early_exit.check(run["creature"], run["checked_positions"], orientation, frame, max_frame)
+        return None
+
+    def eval_population(self, pop, max_frame = 2400, early_exit = None, batch_size = 1, profile = None):
+        for i in range(0, len(pop.creatures), batch_size):
+            self.run_creatures(pop.creatures[i:i + batch_size], max_frame = max_frame, early_exit = early_exit, profile = profile)
+
+@dataclass(frozen = True)
+class PhysicsProfile:
+    # engine fidelity of a run, frames keep counting 1/240 s so every step covers frame_stride of them
+    name:str = "full"
+    frame_stride:int = 1
+    solver_iterations:int = 50
+    frame_fraction:float = 1.0      # share of max_frame that is simulated
+
+    def __post_init__(self):
+        assert self.frame_stride >= 1 and 240 % self.frame_stride == 0, "frame_stride must divide 240"
+        assert self.solver_iterations >= 1
+        assert 0 < self.frame_fraction <= 1
+
+    @staticmethod
+    def get_profile(name):
+        profiles = {
+            "full": PhysicsProfile(),
+            "screening": PhysicsProfile("screening", frame_stride = 4, solver_iterations = 10, frame_fraction = .5),
+        }
+        return profiles[name]
+
+    def get_max_frame(self, max_frame):
+        n_steps = max(1, round(max_frame * self.frame_fraction / self.frame_stride))
+        return n_steps * self.frame_stride
+
+@dataclass(frozen = True)
+class EarlyExit:
+    # policies to stop a run before max_frame, every policy is off by default
+    check_interval:int = 240
+    stall_window:int = 0            # frames without stall_distance of base movement
+    stall_distance:float = 0.01
+    max_tilt:float = None           # radians between the base's z axis and the world's one
+    elite_fitness:float = None      # stop when even max_speed for the remaining frames cannot reach it
+    max_speed:float = 0.05          # base displacement per frame
+
+    def __post_init__(self):
+        assert self.check_interval > 0
+        assert self.stall_window % self.check_interval == 0, "stall_window must be a multiple of check_interval"
+
+    def check(self, cr, checked_positions, orientation, frame, max_frame):
+        position = checked_positions[-1]
+        n_back = self.stall_window // self.check_interval
+        if n_back > 0 and len(checked_positions) > n_back:
+            if math.dist(position, checked_positions[-1 - n_back]) < self.stall_distance:
+                return "stall"
+
+        if self.max_tilt is not None:
+            x, y, _, _ = orientation
+            if 1 - 2 * (x * x + y * y) < math.cos(self.max_tilt):
+                return "fall"
+
+        if self.elite_fitness is not None:
+            # upper bound of Selection.eval_fitness if the base moves at max_speed from now on
+            start = cr.start_position
+            reach = self.max_speed * (max_frame - frame)
+            dist = math.dist(position, start) + reach
+            reward_x = 1 + position[0] + reach - start[0] / 100
+            if dist * reward_x / (1 + cr.get_expanded_link_count() // 2) < self.elite_fitness:
+                return "bound"
+        return None
+
+@dataclass(frozen = True)
+class Racing:
+    # successive halving: every round doubles the horizon for the best keep_fraction of the creatures.
+    # survivors re-run from frame 0, so with the defaults every round costs an eighth of a full
+    # evaluation and a generation simulates half of its frames, 3 rounds would still simulate 75%
+    n_rounds:int = 4
+    keep_fraction:float = 0.5
+
+    def __post_init__(self):
+        assert self.n_rounds >= 1
+        assert 0 < self.keep_fraction <= 1
+
+    def get_horizons(self, max_frame):
+        return [max(1, max_frame // 2 ** (self.n_rounds - 1 - r)) for r in range(self.n_rounds)]
+
+    def get_frame_fraction(self, max_frame = 2400):
+        # simulated frames relative to running every creature to max_frame
+        horizons = self.get_horizons(max_frame)
+        return sum(self.keep_fraction ** r * horizon for r, horizon in enumerate(horizons)) / max_frame
+
+    def select_survivors(self, creatures, indices, horizon, max_frame):
+        survivors, dropped = Racing.rank_survivors(creatures, indices, self.keep_fraction)
+        for i in dropped:
+            Racing.extrapolate(creatures[i], horizon, max_frame)
+        return survivors
+
+    @staticmethod
+    def rank_survivors(creatures, indices, keep_fraction):
+        # the fittest keep_fraction of indices in their original order, and the others
+        fits = manipulation.Selection.eval_fitness([creatures[i] for i in indices])
+        n_keep = max(1, math.ceil(len(indices) * keep_fraction))
+        ranking = np.argsort(fits, kind = "stable")[::-1]
+        return [indices[rank] for rank in np.sort(ranking[:n_keep])], [indices[rank] for rank in ranking[n_keep:]]
+
+    @staticmethod
+    def extrapolate(cr, horizon, max_frame):
+        # creatures that ran the whole horizon keep moving at their average horizontal speed,
+        # runs stopped by an early exit are final already
+        if cr.exit_reason not in (None, "max_frame"):
+            return cr
+        scale = max_frame / horizon
+        start, last = cr.start_position, cr.last_position
+        cr.update_position((
+            start[0] + (last[0] - start[0]) * scale,
+            start[1] + (last[1] - start[1]) * scale,
+            last[2]
+        ))
+        cr.exit_reason, cr.exit_frame = "racing", horizon
+        return cr
+
+@dataclass(frozen = True)
+class Screening:
+    # every creature runs with the cheap profile first, only the fittest keep_fraction is re-run
+    # with the evaluation's profile, the others keep their screening result
+    profile:PhysicsProfile = PhysicsProfile.get_profile("screening")
+    keep_fraction:float = 0.25
+
+    def __post_init__(self):
+        assert 0 < self.keep_fraction <= 1
+
+    def select_survivors(self, creatures, indices):
+        return Racing.rank_survivors(creatures, indices, self.keep_fraction)[0]
+
+class CostModel:
+    # simulation wall time is modelled as intercept + slope * n_expanded_links * max_frame
+    def __init__(self, intercept = 0.0, slope = 1.0, max_samples = 10000):
+        self.intercept = intercept
+        self.slope = slope
+        self.samples = deque(maxlen = max_samples)
+
+    @staticmethod
+    def get_cost_feature(cr, max_frame = 2400):
+        return cr.get_expanded_link_count() * max_frame
+
+    def estimate_cost(self, cr, max_frame = 2400):
+        return self.intercept + self.slope * CostModel.get_cost_feature(cr, max_frame)
+
+    def record(self, cr, max_frame, seconds):
+        self.samples.append((CostModel.get_cost_feature(cr, max_frame), seconds))
+
+    def fit(self):
+        if len(self.samples) < 2:
+            return self.intercept, self.slope
+        features, seconds = np.array(self.samples).T
+        if np.all(features == features[0]):
+            return self.intercept, self.slope
+        slope, intercept = np.polyfit(features, seconds, 1)
+        self.intercept, self.slope = float(intercept), float(slope)
+        return self.intercept, self.slope
+
+    def report(self):
+        seconds = np.array([s for _, s in self.samples])
+        return {
+            "n_samples": len(seconds),
+            "intercept": self.intercept,
+            "slope": self.slope,
+            "mean_seconds": float(np.mean(seconds)) if len(seconds) > 0 else 0.0,
+            "max_seconds": float(np.max(seconds)) if len(seconds) > 0 else 0.0,
+            "total_seconds": float(np.sum(seconds)),
+        }
 
-            # Sometimes PyBullet returns an error doing this part
-            try:
-                last_position, _ = p.getBasePositionAndOrientation(robot, physicsClientId = client_id)
-            except:
-                last_position = (0, 0, 0)
-                break
-            finally:
-                if last_position[2] > 100:
-                    last_position = (0, 0, 0)
-                    break
-
-        cr.update_position(last_position)
-
-    def eval_population(self, pop, max_frame = 2400):
-        for cr in pop.creatures:
-            self.run_creature(cr, max_frame = max_frame)
-        
 class MultiProcessSim():
-    def __init__(self, pool_size):
-        self.sims = [Simulation(i) for i in range(pool_size)]
+    __worker_sim = None
+
+    def __init__(self, pool_size, eval_cache = None, sample_interval = 1, warm_world = False, skip_immobile = True):
+        self.pool_size = pool_size
+        self.cost_model = CostModel()
+        self.eval_cache = eval_cache
+        self.exit_counts = Counter()
+        self.skip_immobile = skip_immobile
+        self.skipped_sims = 0
+        self.pool = Pool(pool_size, initializer = MultiProcessSim.init_worker, initargs = (sample_interval, warm_world))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, "pool", None) is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
 
     @staticmethod
-    def static_run_creature(sim, cr, max_frame = 2400):
-        sim.run_creature(cr, max_frame = max_frame)
+    def init_worker(sample_interval = 1, warm_world = False):
+        # every worker keeps its own DIRECT client for the lifetime of the pool, runs draw no random
+        # numbers so a result does not depend on the worker that computed it
+        MultiProcessSim.__worker_sim = Simulation(os.getpid(), sample_interval = sample_interval, warm_world = warm_world)
+
+    @staticmethod
+    def worker_run_creatures(args):
+        # settle_frames is None for batches, a number for controller variants of one morphology,
+        # the batch comes as PopulationArrays and its views write the results into it
+        indices, arrays, max_frame, early_exit, profile, settle_frames = args
+        crs = arrays.to_creatures()
+        start = time.perf_counter()
+        if settle_frames is None:
+            crs = MultiProcessSim.static_run_creatures(MultiProcessSim.__worker_sim, crs, max_frame, early_exit, profile)
+        else:
+            MultiProcessSim.__worker_sim.run_variants(crs, max_frame = max_frame, early_exit = early_exit, profile = profile, settle_frames = settle_frames)
+        return indices, arrays, time.perf_counter() - start
+
+    @staticmethod
+    def static_run_creature(sim, cr, max_frame = 2400, early_exit = None):
+        sim.run_creature(cr, max_frame = max_frame, early_exit = early_exit)
         return cr
 
-    def eval_population(self, pop, max_frame = 2400):
-        sim_id = 0
-        pool_size = len(self.sims)
-        population_size = len(pop.creatures)
-        pool_argset = []
-        new_creatures = []
-
-        for i, cr in enumerate(pop.creatures):
-            pool_argset.append([self.sims[sim_id], cr, max_frame])
-            sim_id += 1
-            if sim_id >= pool_size or (i + 1) == population_size:
-                with Pool(pool_size) as pool:
-                    creatures = pool.starmap(MultiProcessSim.static_run_creature, pool_argset)
-                    new_creatures.extend(creatures)
-                pool.close()
-                pool_argset = []
-                sim_id = 0
-
-        pop.reset_population(new_creatures)
\ No newline at end of file
+    @staticmethod
+    def static_run_creatures(sim, crs, max_frame = 2400, early_exit = None, profile = None):
+        sim.run_creatures(crs, max_frame = max_frame, early_exit = early_exit, profile = profile)
+        return crs
+
+    @staticmethod
+    def skip_creature(cr, profile = None):
+        # immobile creatures get fitness 0 without a run
+        if profile is None:
+            profile = PhysicsProfile()
+        cr.update_position(cr.start_position)
+        cr.exit_reason, cr.exit_frame = "immobile", 0
+        cr.physics_profile = profile.name
+        return cr
+
+    @staticmethod
+    def get_sim_params(max_frame, early_exit = None, batch_size = 1, profile = None, settle_frames = 0):
+        # everything besides the creature that decides a result, used as the cache key,
+        # batched worlds agree with single runs only within the solver's tolerance
+        if profile is None:
+            profile = PhysicsProfile()
+        sim_params = {"max_frame": max_frame, "profile": profile}
+        if early_exit is not None:
+            sim_params["early_exit"] = early_exit
+        if batch_size > 1:
+            sim_params["batch_size"] = batch_size
+        if settle_frames > 0:
+            sim_params["settle_frames"] = settle_frames
+        return sim_params
+
+    def eval_population(self, pop, max_frame = 2400, early_exit = None, racing = None, batch_size = 1, profile = None, group_variants = False, settle_frames = 0, screening = None):
+        assert batch_size == 1 or not group_variants, "batches and variant groups cannot be combined"
+        assert group_variants or settle_frames == 0, "settle_frames needs group_variants"
+        # a round only runs up to its horizon, the elite bound would compare that against a full-run fitness
+        assert racing is None or early_exit is None or early_exit.elite_fitness is None, "elite_fitness cannot be combined with racing"
+        assert screening is None or early_exit is None or early_exit.elite_fitness is None, "elite_fitness cannot be combined with screening"
+        assert self.pool is not None, "MultiProcessSim is already closed"
+        creatures = pop.creatures
+        survivors = list(range(len(creatures)))
+        horizons = [max_frame] if racing is None else racing.get_horizons(max_frame)
+
+        skipped = set()
+        if self.skip_immobile:
+            skipped = {i for i in survivors if creatures[i].is_immobile()}
+            for i in skipped:
+                MultiProcessSim.skip_creature(creatures[i], profile)
+            survivors = [i for i in survivors if i not in skipped]
+        self.skipped_sims = len(skipped)
+
+        simulated = set()
+        if screening is not None and len(survivors) > 0:
+            simulated.update(self.__run_creatures(
+                pop, survivors, max_frame, early_exit, batch_size, screening.profile, settle_frames if group_variants else None
+            ))
+            survivors = screening.select_survivors(creatures, survivors)
+        for horizon in horizons:
+            simulated.update(self.__run_creatures(
+                pop, survivors, horizon, early_exit, batch_size, profile, settle_frames if group_variants else None
+            ))
+            if horizon < max_frame and len(survivors) > 0:
+                survivors = racing.select_survivors(creatures, survivors, horizon, max_frame)
+
+        # final exit reason of every creature simulated in this call
+        self.exit_counts = Counter(creatures[i].exit_reason for i in simulated)
+
+    def __run_creatures(self, pop, indices, max_frame, early_exit, batch_size = 1, profile = None, settle_frames = None):
+        assert batch_size >= 1
+        creatures = pop.creatures
+        sim_params = MultiProcessSim.get_sim_params(max_frame, early_exit, batch_size, profile, settle_frames or 0)
+        # exit reasons come from this round, run or cached, never from an earlier evaluation
+        for i in indices:
+            creatures[i].exit_reason, creatures[i].exit_frame = None, None
+        pending = [i for i in indices if not self.__lookup_cache(creatures[i], sim_params)]
+
+        costs = [self.cost_model.estimate_cost(creatures[i], max_frame) for i in pending]
+        dispatch_order = [pending[i] for i in np.argsort(costs, kind = "stable")[::-1]] # longest first to shorten the generation makespan
+        if settle_frames is None:
+            batches = [dispatch_order[i:i + batch_size] for i in range(0, len(dispatch_order), batch_size)]
+        else:
+            # controller variants of one morphology go to the same worker, groups keep the longest-first order
+            groups = {}
+            for i in dispatch_order:
+                groups.setdefault(creatures[i].get_morphology_key(), []).append(i)
+            batches = list(groups.values())
+        pool_argset = [(batch, pop.arrays.take(batch), max_frame, early_exit, profile, settle_frames) for batch in batches]
+
+        # idle workers pull the next batch as soon as they finish, results come back by index
+        for batch, arrays, seconds in self.pool.imap_unordered(MultiProcessSim.worker_run_creatures, pool_argset, chunksize = 1):
+            pop.arrays.put(batch, arrays)
+            for i in batch:
+                self.cost_model.record(creatures[i], creatures[i].exit_frame, seconds / len(batch))
+                if self.eval_cache is not None:
+                    self.eval_cache.store(creatures[i], **sim_params)
+        return pending
+
+    def __lookup_cache(self, cr, sim_params):
+        if self.eval_cache is None or not self.eval_cache.lookup(cr, **sim_params):
+            return False
+        cr.physics_profile = sim_params["profile"].name
+        return True
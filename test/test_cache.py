@@ -0,0 +1,66 @@
+import unittest
+import copy
+import numpy as np
+from creature import creature
+from simulation import cache, population, simulation
+
+class EvalCacheTest(unittest.TestCase):
+    def testCacheKey(self):
+        cr_1 = creature.Creature(3)
+        cr_2 = copy.copy(cr_1)
+        cr_3 = creature.Creature(3)
+
+        key_1 = cache.EvalCache.get_key(cr_1, max_frame = 2400)
+        self.assertEqual(key_1, cache.EvalCache.get_key(cr_2, max_frame = 2400))
+        self.assertNotEqual(key_1, cache.EvalCache.get_key(cr_3, max_frame = 2400))
+        self.assertNotEqual(key_1, cache.EvalCache.get_key(cr_1, max_frame = 240))
+
+    def testCacheLookup(self):
+        eval_cache = cache.EvalCache()
+        cr = creature.Creature(3)
+        self.assertFalse(eval_cache.lookup(cr))
+
+        cr.update_position((1, 2, 3))
+        eval_cache.store(cr)
+
+        cr_2 = creature.Creature(1)
+        cr_2.update_dna(cr.dna)
+        self.assertTrue(eval_cache.lookup(cr_2))
+        self.assertEqual(cr_2.last_position, (1, 2, 3))
+        self.assertEqual(cr_2.get_distance(), cr.get_distance())
+        self.assertEqual(eval_cache.hits, 1)
+        self.assertEqual(eval_cache.misses, 1)
+
+    def testCacheEviction(self):
+        eval_cache = cache.EvalCache(max_size = 2)
+        for i in range(3):
+            eval_cache.put(str(i), (0, 0, 0), (i, 0, 0))
+        self.assertEqual(len(eval_cache), 2)
+        self.assertIsNone(eval_cache.get("0"))
+        self.assertEqual(eval_cache.get("2")[1], (2, 0, 0))
+
+    def testCachePersistence(self):
+        base_folder = ".temp/test_cache"
+        cr = creature.Creature(3)
+        cr.update_position((0.1, 0.2, 1 / 3))
+        cr.exit_reason, cr.exit_frame = "stall", 720
+        cache.EvalCache(base_folder = base_folder).store(cr)
+
+        eval_cache = cache.EvalCache(base_folder = base_folder)
+        cr_2 = creature.Creature(1)
+        cr_2.update_dna(cr.dna)
+        self.assertTrue(eval_cache.lookup(cr_2))
+        self.assertEqual(cr_2.last_position, cr.last_position)
+        self.assertEqual((cr_2.exit_reason, cr_2.exit_frame), ("stall", 720))
+        self.assertEqual(len(eval_cache), 1)
+
+    def testCachedPopulationRun(self):
+        pop = population.Population(4, 3)
+        with simulation.MultiProcessSim(2, cache.EvalCache()) as multisim:
+            multisim.eval_population(pop)
+            positions = [cr.last_position for cr in pop.creatures]
+            multisim.eval_population(pop)
+
+            self.assertEqual(multisim.cost_model.report()["n_samples"], 4)
+            self.assertEqual(multisim.eval_cache.hits, 4)
+            self.assertEqual(positions, [cr.last_position for cr in pop.creatures])
@@ -2,6 +2,7 @@ import unittest
 import pybullet as p
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
 from xml.dom.minidom import getDOMImplementation, Element
 from creature import creature, genome
 
@@ -110,6 +111,53 @@ class CreatureTest(unittest.TestCase):
             self.assertEqual(link_count, len(exp_links))
             self.assertGreaterEqual(len(exp_links), len(flat_links))
 
+    def testCreatureExpandTree(self):
+        self.assertIsNotNone(creature.Creature.expand_tree)
+
+        gene_ids, parent_ids, sib_ids = creature.Creature.expand_tree([1, 2, 2])
+        self.assertEqual(list(gene_ids), [0, 1, 2, 2, 1, 2, 2])
+        self.assertEqual(list(parent_ids), [-1, 0, 1, 1, 0, 4, 4])
+        self.assertEqual(list(sib_ids), [0, 0, 0, 1, 1, 0, 1])
+        self.assertEqual(creature.Creature.count_links([1, 2, 2]), 7)
+
+        spec = genome.GeneSpec.get_gene_spec()
+        cr = creature.Creature(3, spec)
+        dna = cr.dna
+        dna[:, spec["link_recurrence"]["index"]] = 0.5 # recurrence of 2
+        cr.update_dna(dna)
+        names = [link.name for link in cr.get_expanded_links()]
+        parents = [link.parent_name for link in cr.get_expanded_links()]
+        self.assertEqual(names, ["Link_0_0_0", "Link_1_0_1", "Link_2_0_2", "Link_2_1_3", "Link_1_1_4", "Link_2_0_5", "Link_2_1_6"])
+        self.assertEqual(parents, ["None", "Link_0_0_0", "Link_1_0_1", "Link_1_0_1", "Link_0_0_0", "Link_1_1_4", "Link_1_1_4"])
+
+    def testCreatureExpandedLinkCount(self):
+        self.assertIsNotNone(creature.Creature.count_expanded_links)
+
+        spec = genome.GeneSpec.get_gene_spec()
+        for gene_count in range(1, 8):
+            cr = creature.Creature(gene_count, spec)
+            n_links = creature.Creature.count_expanded_links(cr.dna, spec)
+            self.assertEqual(n_links, cr.get_expanded_link_count())
+            self.assertEqual(n_links, len(cr.get_expanded_links()))
+            self.assertEqual(n_links, cr.get_expanded_link_count())
+
+        dna = genome.Genome.init_random_genome(12, len(spec))
+        dna[:, spec["link_recurrence"]["index"]] = 0.99
+        self.assertEqual(creature.Creature.count_expanded_links(dna, spec), (3 ** 12 - 1) // 2)
+
+    def testCreatureConcurrentExpansion(self):
+        spec = genome.GeneSpec.get_gene_spec()
+        crs = [creature.Creature(6, spec) for _ in range(8)]
+        expected = [[link.name for link in creature.Creature.expand_links(cr.get_flat_links())] for cr in crs]
+
+        def expand(cr):
+            return [[link.name for link in creature.Creature.expand_links(cr.get_flat_links())] for _ in range(5)]
+
+        with ThreadPoolExecutor(max_workers = 4) as executor:
+            for names, expected_names in zip(executor.map(expand, crs), expected):
+                for name_list in names:
+                    self.assertEqual(name_list, expected_names)
+
 
 
 class CreatureXMLTest(unittest.TestCase):
@@ -156,6 +204,39 @@ class CreatureXMLTest(unittest.TestCase):
 
         self.assertEqual(f_str, cr.get_robot_xml().toprettyxml())
 
+    def testCreatureURDFMatchesXML(self):
+        self.assertIsNotNone(creature.Creature.creature_to_urdf)
+
+        spec = genome.GeneSpec.get_gene_spec()
+        for gene_count in range(1, 7):
+            cr = creature.Creature(gene_count, spec)
+            links = cr.get_expanded_links()
+            self.assertEqual(creature.Creature.creature_to_urdf(links), cr.get_robot_xml().toprettyxml())
+            self.assertEqual(cr.get_robot_urdf(), creature.Creature.creature_to_xml(links).toprettyxml())
+
+        links = creature.Creature(3, spec).get_expanded_links()
+        robot_name = 'robot "<&>"'
+        self.assertEqual(
+            creature.Creature.creature_to_urdf(links, robot_name),
+            creature.Creature.creature_to_xml(links, robot_name).toprettyxml()
+        )
+
+    def testCreatureURDFFragments(self):
+        spec = genome.GeneSpec.get_gene_spec()
+        cr = creature.Creature(5, spec)
+        dna = cr.dna
+        dna[:, spec["link_recurrence"]["index"]] = 0.99
+        cr.update_dna(dna)
+        links = cr.get_expanded_links()
+        self.assertEqual(len(links), 121)
+        self.assertEqual(cr.get_robot_urdf(), cr.get_robot_xml().toprettyxml())
+
+        fragments = creature.Creature.gene_to_urdf_fragments(links[-1].gene_dict)
+        self.assertEqual(
+            creature.Creature.link_to_urdf(links[-1].name, links[-1].parent_name, links[-1].gene_dict, fragments = fragments),
+            creature.Creature.link_to_urdf(links[-1].name, links[-1].parent_name, links[-1].gene_dict)
+        )
+
     def testCreatureLoadXML(self):
         spec = genome.GeneSpec.get_gene_spec()
 
@@ -189,4 +270,41 @@ class CreatureMoveTest(unittest.TestCase):
         cr.update_position((0, 0, 1))
         self.assertGreater(cr.get_distance(), 0)
         self.assertEqual(cr.start_position, (0, 0, 0))
-        self.assertEqual(cr.last_position, (0, 0, 1))
\ No newline at end of file
+        self.assertEqual(cr.last_position, (0, 0, 1))
+
+    def testMorphologyKey(self):
+        cr_1 = creature.Creature(3)
+        cr_2 = creature.Creature(1)
+        dna = cr_1.dna.copy()
+        dna[:, cr_1.spec["control_amp"]["index"]] = 0.1
+        dna[:, cr_1.spec["control_freq"]["index"]] = 0.9
+        cr_2.update_dna(dna)
+        self.assertEqual(cr_1.get_morphology_key(), cr_2.get_morphology_key())
+
+        dna[0, cr_1.spec["link_radius"]["index"]] += 0.1
+        cr_2.update_dna(dna)
+        self.assertNotEqual(cr_1.get_morphology_key(), cr_2.get_morphology_key())
+
+    def testImmobileCreature(self):
+        cr = creature.Creature(3)
+        dna = cr.dna.copy()
+        dna[:, cr.spec["link_recurrence"]["index"]] = 0.5
+        cr.update_dna(dna)
+        self.assertFalse(cr.is_immobile())
+
+        dna[1:, cr.spec["control_amp"]["index"]] = 0
+        cr = creature.Creature(3, dna = dna)
+        self.assertTrue(cr.is_immobile())
+        self.assertIsNone(cr.motors)
+
+        dna[2, cr.spec["control_amp"]["index"]] = 0.5
+        cr = creature.Creature(3, dna = dna)
+        self.assertFalse(cr.is_immobile())
+        self.assertIsNone(cr.motors)
+
+        cr = creature.Creature(1)
+        dna = cr.dna.copy()
+        dna[:, cr.spec["link_recurrence"]["index"]] = 0
+        cr.update_dna(dna)
+        self.assertEqual(cr.get_expanded_link_count(), 1)
+        self.assertTrue(cr.is_immobile())
\ No newline at end of file
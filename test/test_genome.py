@@ -77,6 +77,19 @@ class GenomeTest(unittest.TestCase):
 
 
 
+    def testGenomeStacking(self):
+        self.assertIsNotNone(genome.Genome.stack_genomes)
+
+        genomes = [genome.Genome.init_random_genome(n, 6) for n in [2, 5, 3]]
+        stacked, lengths = genome.Genome.stack_genomes(genomes)
+        self.assertEqual(stacked.shape, (3, 5, 6))
+        self.assertEqual(list(lengths), [2, 5, 3])
+        for i, data in enumerate(genomes):
+            self.assertTrue(np.array_equal(stacked[i, :lengths[i]], data))
+            self.assertEqual(np.sum(stacked[i, lengths[i]:]), 0)
+
+
+
 class GeneSpecTest(unittest.TestCase):
     def testGeneSpecClass(self):
         self.assertIsNotNone(genome.GeneSpec)
@@ -99,6 +112,33 @@ class GeneSpecTest(unittest.TestCase):
         self.assertEqual(spec["link_recurrence"]["type"], "discrete")
         self.assertEqual(spec["joint_origin_xyz_3"]["type"], "continuous")
 
+    def testCompiledGeneSpec(self):
+        self.assertIsNotNone(genome.GeneSpec.compile_spec)
+
+        spec = genome.GeneSpec.get_gene_spec()
+        compiled = genome.GeneSpec.compile_spec(spec)
+        self.assertIs(compiled, genome.GeneSpec.compile_spec())
+        self.assertEqual(list(compiled.dtype.names), list(spec.keys()))
+
+        data = genome.Genome.init_random_genome(20, len(spec))
+        genome_array = compiled.decode(data)
+        self.assertEqual(genome_array.shape, (20,))
+        self.assertEqual(genome_array["link_shape"].dtype, np.int64)
+        self.assertEqual(genome_array["link_length_1"].dtype, np.float64)
+        for gene, gene_record in zip(data, genome_array):
+            gene_dict = genome.Genome.gene_to_dict(gene, spec)
+            for key in spec.keys():
+                self.assertEqual(gene_dict[key], gene_record[key])
+            self.assertEqual(compiled.decode(gene)[()], gene_record)
+
+        self.assertEqual(genome.Genome.genome_to_dict(data, spec), [genome.Genome.gene_to_dict(gene, spec) for gene in data])
+        self.assertTrue(np.array_equal(compiled.decode_key(data, "link_recurrence"), genome_array["link_recurrence"]))
+
+        stacked, lengths = genome.Genome.stack_genomes([data[:5], data[5:]])
+        stacked_array = compiled.decode(stacked)
+        self.assertEqual(stacked_array.shape, (2, 15))
+        self.assertTrue(np.array_equal(stacked_array[1, :15], genome_array[5:]))
+
     def testGeneSpecRedefinition(self):        
         new_spec = {
             "a": {"scale":1, "type":"categorical", "index":1}, 
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+import pybullet as p
+from creature import creature
+from simulation import loader
+
+class MultiBodyLoaderTest(unittest.TestCase):
+    def testLoadCreature(self):
+        client_id = p.connect(p.DIRECT)
+        for _ in range(5):
+            cr = creature.Creature(4)
+            links = cr.get_expanded_links()
+            robot = loader.MultiBodyLoader.load_creature(cr, client_id)
+
+            self.assertEqual(p.getNumJoints(robot, physicsClientId = client_id), len(cr.get_motors()))
+            self.assertEqual(p.getNumJoints(robot, physicsClientId = client_id), len(links) - 1)
+            for joint_id, link in enumerate(links[1:]):
+                joint_info = p.getJointInfo(robot, joint_id, physicsClientId = client_id)
+                _, _, link_mass = creature.Creature.link_to_geometry(link.gene_dict)
+                self.assertEqual(joint_info[2], p.JOINT_REVOLUTE)
+                self.assertAlmostEqual(p.getDynamicsInfo(robot, joint_id, physicsClientId = client_id)[0], link_mass)
+        p.disconnect(client_id)
+
+    def testMatchesURDFLoader(self):
+        client_id = p.connect(p.DIRECT)
+        p.setPhysicsEngineParameter(enableFileCaching = 0, physicsClientId = client_id)
+        for _ in range(5):
+            cr = creature.Creature(4)
+            cr.write_robot_xml(".temp/test_loader.urdf")
+            robot_1 = p.loadURDF(".temp/test_loader.urdf", physicsClientId = client_id)
+            robot_2 = loader.MultiBodyLoader.load_creature(cr, client_id)
+
+            n_joints = p.getNumJoints(robot_1, physicsClientId = client_id)
+            self.assertEqual(n_joints, p.getNumJoints(robot_2, physicsClientId = client_id))
+            for link_id in range(-1, n_joints):
+                dyn_1 = p.getDynamicsInfo(robot_1, link_id, physicsClientId = client_id)
+                dyn_2 = p.getDynamicsInfo(robot_2, link_id, physicsClientId = client_id)
+                self.assertEqual(dyn_1[:3], dyn_2[:3])
+            for joint_id in range(n_joints):
+                info_1 = p.getJointInfo(robot_1, joint_id, physicsClientId = client_id)
+                info_2 = p.getJointInfo(robot_2, joint_id, physicsClientId = client_id)
+                self.assertEqual(info_1[13:17], info_2[13:17])
+        p.disconnect(client_id)
+
+    def testQuaternion(self):
+        for rpy in np.random.uniform(0, np.pi * 2, size = (10, 3)):
+            quat = loader.MultiBodyLoader.rpy_to_quaternion(*rpy)
+            self.assertTrue(np.allclose(np.abs(quat), np.abs(p.getQuaternionFromEuler(rpy))))
@@ -55,6 +55,38 @@ class SelectionClassTest(unittest.TestCase):
 
 
 
+    def testFitnessArrays(self):
+        creatures = []
+        for i in range(50):
+            cr = creature.Creature(np.random.randint(2, 6))
+            cr.reset_start_position(tuple(np.random.normal(size = 3)))
+            cr.update_position(tuple(np.random.normal(size = 3) * 10))
+            creatures.append(cr)
+        creatures[0].update_position((np.nan, 0, 0))
+
+        expected = []
+        for cr in creatures:
+            start, finish = np.array(cr.start_position), np.array(cr.last_position)
+            reward_x  = 1 + finish[0] - start[0] / 100
+            penalty_n = 1 + int(len(cr.get_expanded_links()) / 2)
+            expected.append(np.nan_to_num(np.maximum(0, cr.get_distance() * reward_x / penalty_n), nan = 0))
+
+        starts, finishes, n_links = manipulation.Selection.get_fitness_arrays(creatures)
+        self.assertEqual(starts.shape, (50, 3))
+        self.assertEqual(finishes.shape, (50, 3))
+        self.assertTrue(np.array_equal(manipulation.Selection.eval_fitness(creatures), np.array(expected)))
+        self.assertTrue(np.array_equal(
+            creature.Creature.get_distances(starts, finishes), 
+            np.array([cr.get_distance() for cr in creatures])
+        ))
+        # the distance before the batch path was added
+        baseline = [
+            np.nan_to_num(np.linalg.norm(np.asarray(cr.last_position) - np.asarray(cr.start_position)))
+            for cr in creatures
+        ]
+        self.assertTrue(np.array_equal(creature.Creature.get_distances(starts, finishes), np.array(baseline)))
+        self.assertTrue(np.array_equal(np.array([cr.get_distance() for cr in creatures]), np.array(baseline)))
+
     def testParentSelection(self):
         self.assertIsNotNone(manipulation.Selection.select_parent_indices)
         self.assertIsNotNone(manipulation.Selection.select_parents)
@@ -77,6 +109,24 @@ class SelectionClassTest(unittest.TestCase):
             self.assertIn(p2, parents)
             self.assertNotEqual(p1, p2)
 
+    def testParentPairSelection(self):
+        fits = np.array([1, 1, 1, 2, 5, 0, 3])
+        pairs = manipulation.Selection.select_parent_index_pairs(fits, 200000)
+        self.assertEqual(pairs.shape, (200000, 2))
+        self.assertTrue(np.all(pairs[:, 0] != pairs[:, 1]))
+        self.assertFalse(np.any(pairs == 5))
+
+        # same distribution as repeated select_parent_indices calls
+        probs = fits / fits.sum()
+        expected = np.outer(probs, probs) / (1 - probs)[:, None]
+        np.fill_diagonal(expected, 0)
+        observed = np.zeros((len(fits), len(fits)))
+        np.add.at(observed, (pairs[:, 0], pairs[:, 1]), 1)
+        self.assertTrue(np.allclose(observed / len(pairs), expected, atol = 3e-3))
+
+        pairs = manipulation.Selection.select_parent_index_pairs([0, 0, 0, 0], 100)
+        self.assertTrue(np.all(pairs[:, 0] != pairs[:, 1]))
+
     def testParentSelectionBasedOnSimulation(self):
         pop_size = 5
         pop = population.Population(pop_size, 5)
@@ -113,6 +163,21 @@ class CrossoverClassTest(unittest.TestCase):
             self.assertGreater(len(child_genome), 1)
             self.assertLess(len(child_genome), len(genome_1) + len(genome_2))
         
+    def testCrossoverBatch(self):
+        parents = [genome.Genome.init_random_genome(n, 4) for n in [1, 3, 6, 9]]
+        stacked, lengths = genome.Genome.stack_genomes(parents)
+        pairs = np.array([(i, j) for i in range(4) for j in range(4) if i != j] * 10)
+        children, child_lengths = manipulation.Crossover.crossover_batch(stacked, lengths, pairs, 8, 1.2)
+
+        for (id1, id2), child, n in zip(pairs, children, child_lengths):
+            # every child is some head of the first parent followed by some tail of the second one
+            candidates = [
+                np.concatenate((parents[id1][:ind_1], parents[id2][ind_2:]))[:min(int(max(lengths[id1], lengths[id2]) * 1.2), 8)]
+                for ind_1 in range(1, lengths[id1] + 1) for ind_2 in range(lengths[id2])
+            ]
+            self.assertTrue(any(len(c) == n and np.array_equal(c, child[:n]) for c in candidates))
+            self.assertTrue(np.all(child[n:] == 0))
+
 class MutationClassTest(unittest.TestCase):
     def testMutationClass(self):
         self.assertIsNotNone(manipulation.Mutation)
@@ -175,4 +240,126 @@ class MutationClassTest(unittest.TestCase):
         mutated_dna = manipulation.Mutation.grow_mutate(dna, mutation_rate = 0)
         self.assertTrue(len(mutated_dna) == len(dna))
         self.assertEqual(mutated_dna.shape[1], dna.shape[1])
-        self.assertTrue(np.mean(dna == mutated_dna) == 1)
\ No newline at end of file
+        self.assertTrue(np.mean(dna == mutated_dna) == 1)
+
+    def testMutationBatch(self):
+        dnas = [genome.Genome.init_random_genome(n, 5) for n in [1, 2, 4, 7]]
+        children, lengths = genome.Genome.stack_genomes(dnas)
+
+        mutated = manipulation.Mutation.point_mutate_batch(children, lengths, 1, .05)
+        for dna, child, n in zip(dnas, mutated, lengths):
+            # a single amount per child, values past the bounds are clipped
+            unclipped = (child[:n] > 0.0001) & (child[:n] < 0.999)
+            amounts = (child[:n] - dna)[unclipped]
+            self.assertTrue(np.allclose(amounts, amounts[0]))
+            self.assertLessEqual(abs(amounts[0]), .05)
+            self.assertTrue(np.all(child[n:] == 0))
+        self.assertTrue(np.array_equal(manipulation.Mutation.point_mutate_batch(children, lengths, 0), children))
+
+        shrunk, shrunk_lengths = manipulation.Mutation.shrink_mutate_batch(children, lengths, 2, 1)
+        self.assertEqual(shrunk_lengths.tolist(), [1, 2, 2, 2])
+        for dna, child, n in zip(dnas, shrunk, shrunk_lengths):
+            self.assertTrue(np.array_equal(child[:n], dna[:2]))
+        shrunk, shrunk_lengths = manipulation.Mutation.shrink_mutate_batch(children, lengths, 2, 0)
+        self.assertTrue(np.array_equal(shrunk, children))
+
+        grown, grown_lengths = manipulation.Mutation.grow_mutate_batch(children, lengths, 10, 1)
+        self.assertEqual(grown_lengths.tolist(), [2, 4, 8, 10])
+        for dna, child, n in zip(dnas, grown, grown_lengths):
+            self.assertTrue(np.array_equal(child[:n], np.append(dna, dna, axis = 0)[:10]))
+            self.assertTrue(np.all(child[n:] == 0))
+
+    def testGenerateChildrenDNA(self):
+        dnas = [genome.Genome.init_random_genome(n, 17) for n in [2, 3, 5, 8]]
+        pairs = manipulation.Selection.select_parent_index_pairs([1, 1, 1, 1], 200)
+        children = manipulation.NewGeneration.generate_children_dna(dnas, pairs, 2, 6, grow_mutation_rate = .3)
+        self.assertEqual(len(children), 200)
+        for child in children:
+            self.assertGreaterEqual(len(child), 1)
+            self.assertLessEqual(len(child), 6)
+            self.assertTrue(np.all((child >= 0) & (child <= 1)))
+        self.assertEqual(manipulation.NewGeneration.generate_children_dna(dnas, np.zeros((0, 2), dtype = int)), [])
+
+    def testSeededBreeding(self):
+        dnas = [genome.Genome.init_random_genome(n, 17, np.random.default_rng(n)) for n in [2, 3, 5, 8]]
+        results = []
+        for _ in range(2):
+            rng = np.random.default_rng(3)
+            pairs = manipulation.Selection.select_parent_index_pairs([1, 2, 3, 4], 20, rng)
+            children = manipulation.NewGeneration.generate_children_dna(dnas, pairs, rng = rng)
+            children.append(manipulation.NewGeneration.generate_child_dna(dnas[0], dnas[1], rng = rng))
+            results.append(children)
+        for child_1, child_2 in zip(*results):
+            self.assertTrue(np.array_equal(child_1, child_2))
+
+class ExpansionBudgetTest(unittest.TestCase):
+    def testExpansionBudgetPolicies(self):
+        spec = genome.GeneSpec.get_gene_spec()
+        dna = genome.Genome.init_random_genome(10, len(spec))
+        dna[:, spec["link_recurrence"]["index"]] = 0.99
+        small_dna = dna[:3]
+
+        for policy in ["repair", "truncate"]:
+            budget = manipulation.ExpansionBudget(100, policy)
+            self.assertIs(budget.apply(small_dna), small_dna)
+            self.assertEqual(budget.fired, 0)
+
+            new_dna = budget.apply(dna)
+            self.assertEqual(budget.fired, 1)
+            self.assertLessEqual(budget.count_links(new_dna), 100)
+            self.assertEqual(new_dna.shape[1], dna.shape[1])
+            self.assertEqual(len(new_dna), 10 if policy == "repair" else 4)
+
+        budget = manipulation.ExpansionBudget(100, "reject")
+        self.assertIsNone(budget.apply(dna))
+        self.assertEqual(budget.fired, 1)
+
+        with self.assertRaises(AssertionError):
+            manipulation.ExpansionBudget(100, "unknown")
+
+    def testExpansionBudgetNewGeneration(self):
+        for policy in ["reject", "repair", "truncate"]:
+            budget = manipulation.ExpansionBudget(10, policy)
+            pop = population.Population(10, 3)
+            for cr in pop.creatures:
+                cr.update_position((1, 0, 0))
+            pop.reset_population_new_gen(max_length_limit = 8, grow_mutation_rate = .5, expansion_budget = budget)
+            for cr in pop.creatures:
+                self.assertLessEqual(cr.get_expanded_link_count(), 10)
+
+    def testExpansionBudgetSingleFitParent(self):
+        # retries draw parents like the batch does, with the uniform fallback below two fit creatures
+        pop = population.Population(6, 3, rng = 1)
+        pop.creatures[0].update_position((1, 0, 0))
+        budget = manipulation.ExpansionBudget(2, "reject")
+        pop.reset_population_new_gen(expansion_budget = budget)
+        self.assertEqual(len(pop.creatures), 6)
+        self.assertGreater(budget.fired, 0)
+        for cr in pop.creatures:
+            self.assertLessEqual(cr.get_expanded_link_count(), 2)
+
+    def testExpansionBudgetUnreachable(self):
+        pop = population.Population(10, 3)
+        for cr in pop.creatures:
+            cr.update_position((1, 0, 0))
+        with self.assertRaises(AssertionError):
+            pop.reset_population_new_gen(expansion_budget = manipulation.ExpansionBudget(1, "reject"))
+
+        # every gene repeats 3 times and nothing mutates, so no child stays within 2 links: each one
+        # is rejected in the batch and in 3 retries, then truncated, and the budget counts all 5
+        for cr in pop.creatures:
+            dna = cr.dna.copy()
+            dna[:, cr.spec["link_recurrence"]["index"]] = 0.99
+            cr.update_dna(dna)
+            cr.update_position((1, 0, 0))
+        budget = manipulation.ExpansionBudget(2, "reject", max_retries = 3)
+        pop.reset_population_new_gen(
+            point_mutation_rate = 0, 
+            shrink_mutation_rate = 0, 
+            grow_mutation_rate = 0, 
+            expansion_budget = budget
+        )
+        self.assertEqual(len(pop.creatures), 10)
+        self.assertEqual(budget.fired, 50)
+        for cr in pop.creatures:
+            self.assertLessEqual(cr.get_expanded_link_count(), 2)
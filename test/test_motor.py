@@ -25,6 +25,22 @@ class MotorClassTest(unittest.TestCase):
         self.assertLessEqual(m(), 0)
         self.assertLessEqual(m(), 0)
 
+    def testMotorBank(self):
+        motors = [motor.Motor(w, a, f) for w, a, f in [(0, 2, .5), (1, 2, 1.3), (0, .7, 2.9), (1, 1, .01)]]
+        bank = motor.MotorBank.from_motors(motors)
+        self.assertEqual(len(bank), 4)
+        for _ in range(20):
+            self.assertEqual(bank().tolist(), [float(m()) for m in motors])
+
+        self.assertEqual(len(motor.MotorBank([], [], [])()), 0)
+
+    def testMotorSchedule(self):
+        motors = [motor.Motor(w, a, f) for w, a, f in [(0, 2, .5), (1, 2, 1.3), (0, .7, 2.9), (1, 1, .01)]]
+        schedule = motor.MotorBank.from_motors(motors).get_schedule(50)
+        self.assertEqual(schedule.shape, (50, 4))
+        for row in schedule:
+            self.assertEqual(row.tolist(), [float(m()) for m in motors])
+
 class MotorCreatureTest(unittest.TestCase):
     def testCreatureMotor(self):
         self.assertIsNotNone(creature.Creature.get_motors)
@@ -38,6 +54,27 @@ class MotorCreatureTest(unittest.TestCase):
             self.assertLessEqual(motor(), 1)
             self.assertLessEqual(motor(), 1)
 
+    def testCreatureMotorBank(self):
+        cr = creature.Creature(5)
+        motors = cr.get_motors()
+        bank = cr.get_motor_bank()
+        self.assertIs(bank, cr.get_motor_bank())
+        self.assertEqual(len(bank), len(motors))
+        for _ in range(10):
+            self.assertEqual(bank().tolist(), [float(m()) for m in motors])
+
+    def testCreatureControlSchedule(self):
+        cr = creature.Creature(5)
+        motors = cr.get_motors()
+        schedule = cr.get_control_schedule(2400)
+        self.assertEqual(schedule.shape, (10, len(motors)))
+        self.assertEqual(cr.get_control_schedule(2401).shape, (11, len(motors)))
+        self.assertTrue(np.array_equal(cr.get_control_schedule(480), schedule[:2]))
+        for row in schedule:
+            self.assertEqual(row.tolist(), [float(m()) for m in motors])
+        # calling the motors does not change the schedule
+        self.assertTrue(np.array_equal(cr.get_control_schedule(2400), schedule))
+
     def testDistanceMoved(self):
         p.connect(p.DIRECT)
         p.setGravity(0, 0, -10)
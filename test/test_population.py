@@ -45,7 +45,9 @@ class PopulationClassTest(unittest.TestCase):
         pop.reset_population([cr_1, cr_2])
         self.assertEqual(len(pop.creatures), 2)
         self.assertIsInstance(pop.creatures[0], creature.Creature)
-        self.assertEqual(pop.creatures[0], cr_1)
+        # the creatures are views of the population's arrays, they hold copies of the given ones
+        self.assertTrue(np.array_equal(pop.creatures[0].dna, cr_1.dna))
+        self.assertEqual(pop.creatures[0].last_position, cr_1.last_position)
         self.assertEqual(pop.creatures[1].last_position, cr_2.last_position)
 
     def testSelectParents(self):
@@ -78,6 +80,25 @@ class PopulationCSVExportingTest(unittest.TestCase):
             self.assertTrue(np.mean(dna_1 == dna_3) == 1)
             self.assertTrue(np.mean(dna_2 == dna_4) == 1)
 
+    def testCSVRandomState(self):
+        pop_1 = population.Population(5, 3, rng = 7)
+        pop_1.pop_to_csvs(base_folder = ".temp/csvs_rng", identifier = "simulation")
+        pop_2 = population.Population(5, 3)
+        pop_2.pop_from_csvs(base_folder = ".temp/csvs_rng", identifier = "simulation")
+        self.assertTrue(np.array_equal(pop_1.rng.random(10), pop_2.rng.random(10)))
+
+    def testSeededPopulation(self):
+        pops = [population.Population(10, 4, rng = 42) for _ in range(2)]
+        for pop in pops:
+            for i, cr in enumerate(pop.creatures):
+                cr.update_position((i, 0, 0))
+            pop.reset_population_new_gen(num_new_random = 2)
+        for cr_1, cr_2 in zip(pops[0].creatures, pops[1].creatures):
+            self.assertTrue(np.array_equal(cr_1.dna, cr_2.dna))
+
+        other = population.Population(10, 4, rng = 43)
+        self.assertFalse(np.array_equal(other.creatures[0].dna, pops[0].creatures[0].dna))
+
 class NewGenerationTest(unittest.TestCase):
     def testNewGenerationManually(self):
         pop = population.Population(10, 3)
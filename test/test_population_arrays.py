@@ -0,0 +1,83 @@
+import unittest
+import pickle
+import numpy as np
+from creature import creature
+from simulation import manipulation, population, population_arrays
+
+class PopulationArraysTest(unittest.TestCase):
+    def testPopulationState(self):
+        pop = population.Population(10, 4)
+        pop.reset_population_random_length()
+        arrays = pop.arrays
+        for cr in pop.creatures:
+            self.assertIsInstance(cr, population_arrays.CreatureView)
+            self.assertTrue(np.shares_memory(cr.dna, arrays.genes))
+            cr.update_position(tuple(np.random.normal(size = 3)))
+
+        self.assertEqual(len(arrays), 10)
+        self.assertEqual(arrays.genes.shape, (sum(len(cr.dna) for cr in pop.creatures), len(arrays.spec)))
+        self.assertTrue(np.array_equal(arrays.generations, np.zeros(10)))
+        for i, cr in enumerate(pop.creatures):
+            self.assertEqual(arrays.n_links[i], creature.Creature.count_expanded_links(cr.dna, cr.spec))
+            self.assertEqual(tuple(arrays.finishes[i]), cr.last_position)
+
+        fits = manipulation.Selection.eval_fitness(pop.creatures)
+        self.assertTrue(np.array_equal(arrays.eval_fitness(), fits))
+        self.assertTrue(np.array_equal(arrays.fitness, fits))
+
+        pop.reset_population_new_gen()
+        self.assertIsNot(pop.arrays, arrays)
+        self.assertTrue(np.array_equal(pop.arrays.generations, np.ones(10)))
+
+    def testCreatureViews(self):
+        pop = population.Population(5, 3)
+        arrays = pop.arrays
+        for i, cr in enumerate(pop.creatures):
+            self.assertIsNone(cr.motors)
+            self.assertEqual(len(cr.get_expanded_links()), arrays.n_links[i])
+            cr.reset_start_position((0, i, 0))
+            cr.update_position((i, 0, 0))
+            cr.exit_reason, cr.exit_frame, cr.physics_profile = "max_frame", i, "full"
+        self.assertTrue(np.array_equal(arrays.starts[:, 1], np.arange(5)))
+        self.assertTrue(np.array_equal(arrays.finishes[:, 0], np.arange(5)))
+        self.assertEqual(list(arrays.exit_frames), list(range(5)))
+        self.assertEqual(pop.creatures[2].last_position, (2, 0, 0))
+
+        cr = pop.creatures[0]
+        dna = cr.dna.copy()
+        dna[:, cr.spec["link_recurrence"]["index"]] = 0.99
+        cr.update_dna(dna)
+        self.assertTrue(np.array_equal(arrays.get_dna(0), dna))
+        self.assertEqual(arrays.n_links[0], cr.get_expanded_link_count())
+        self.assertEqual(cr.last_position, (0, 0, 0))
+        self.assertIsNone(arrays.exit_reasons[0])
+        with self.assertRaises(AssertionError):
+            cr.update_dna(dna[:1])
+
+    def testTakePut(self):
+        pop = population.Population(6, 3)
+        subset = pop.arrays.take([4, 1])
+        self.assertEqual(len(subset), 2)
+        self.assertTrue(np.array_equal(subset.get_dna(0), pop.creatures[4].dna))
+        self.assertFalse(np.shares_memory(subset.genes, pop.arrays.genes))
+
+        crs = pickle.loads(pickle.dumps(subset)).to_creatures()
+        for cr in crs:
+            cr.update_position((1, 2, 3))
+            cr.exit_reason, cr.exit_frame = "stalled", 240
+        pop.arrays.put([4, 1], crs[0].arrays)
+        for i, cr in enumerate(pop.creatures):
+            moved = i in [1, 4]
+            self.assertEqual(cr.last_position, (1, 2, 3) if moved else (0, 0, 0))
+            self.assertEqual(cr.exit_reason, "stalled" if moved else None)
+
+    def testCreaturePickleDropsCaches(self):
+        cr = creature.Creature(5)
+        size = len(pickle.dumps(cr))
+        cr.get_expanded_links()
+        cr.get_motors()
+        self.assertEqual(len(pickle.dumps(cr)), size)
+
+        restored = pickle.loads(pickle.dumps(cr))
+        self.assertTrue(np.array_equal(restored.dna, cr.dna))
+        self.assertEqual(len(restored.get_motors()), len(cr.get_motors()))
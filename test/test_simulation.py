@@ -1,7 +1,21 @@
 import unittest
-from simulation import simulation, population
+import copy
+import numpy as np
+import pybullet as p
+from simulation import simulation, population, loader, cache, manipulation
 from creature import creature
 
+def get_variants(cr, n_variants):
+    control_ids = [cr.spec[key]["index"] for key in ["control_waveform", "control_amp", "control_freq"]]
+    variants = []
+    for _ in range(n_variants):
+        variant = creature.Creature(1)
+        dna = cr.dna.copy()
+        dna[:, control_ids] = np.random.random((len(dna), len(control_ids)))
+        variant.update_dna(dna)
+        variants.append(variant)
+    return variants
+
 class SimulationClassTest(unittest.TestCase):
     def testSimulationClass(self):
         self.assertIsNotNone(simulation.Simulation)
@@ -52,4 +66,362 @@ class SimulationClassTest(unittest.TestCase):
         dists = [cr.get_distance() for cr in pop.creatures]
         self.assertEqual(len(dists), pop_size)
         for dist in dists:
-            self.assertGreater(dist, 0)
\ No newline at end of file
+            self.assertGreater(dist, 0)
+
+    def testMultiProcessPersistentPool(self):
+        pop = population.Population(4, 3)
+        with simulation.MultiProcessSim(2) as multisim:
+            worker_pids = [w.pid for w in multisim.pool._pool]
+            for _ in range(3):
+                multisim.eval_population(pop)
+                self.assertEqual(worker_pids, [w.pid for w in multisim.pool._pool])
+            self.assertEqual(len(pop.creatures), 4)
+
+        self.assertIsNone(multisim.pool)
+        with self.assertRaises(AssertionError):
+            multisim.eval_population(pop)
+
+    def testMultiProcessResultOrder(self):
+        pop = population.Population(6, 3)
+        dnas = [cr.dna for cr in pop.creatures]
+        with simulation.MultiProcessSim(3) as multisim:
+            multisim.eval_population(pop)
+
+        self.assertEqual(len(pop.creatures), len(dnas))
+        for cr, dna in zip(pop.creatures, dnas):
+            self.assertTrue(np.array_equal(cr.dna, dna))
+            self.assertGreater(cr.get_distance(), 0)
+
+    def testMultiBodyMatchesURDF(self):
+        sim_1 = simulation.Simulation(use_urdf = True)
+        sim_2 = simulation.Simulation()
+        for _ in range(3):
+            cr_1 = creature.Creature(4)
+            cr_2 = creature.Creature(1)
+            cr_2.update_dna(cr_1.dna)
+            sim_1.run_creature(cr_1)
+            sim_2.run_creature(cr_2)
+            self.assertEqual(cr_1.last_position, cr_2.last_position)
+
+    def testLargeCreatureFallsBackToURDF(self):
+        sim = simulation.Simulation()
+        cr = creature.Creature(6)
+        cr.dna[:, cr.spec["link_recurrence"]["index"]] = 0.99
+        self.assertGreater(cr.get_expanded_link_count(), loader.MultiBodyLoader.max_links)
+        sim.run_creature(cr, max_frame = 240)
+        self.assertEqual(p.getNumJoints(1, physicsClientId = sim.client_id), len(cr.get_motors()))
+
+    def testRerunCreature(self):
+        sim = simulation.Simulation()
+        cr = creature.Creature(3)
+        sim.run_creature(cr, max_frame = 720)
+        last_position = cr.last_position
+        sim.run_creature(cr, max_frame = 720)
+        self.assertEqual(cr.last_position, last_position)
+
+    def testSampledStepping(self):
+        sims = [simulation.Simulation(sample_interval = interval) for interval in [1, 7, 240]]
+        early_exit = simulation.EarlyExit(stall_window = 480, stall_distance = .5)
+        for _ in range(3):
+            dna = creature.Creature(3).dna
+            results = []
+            for sim in sims:
+                for policy in [None, early_exit]:
+                    cr = creature.Creature(1)
+                    cr.update_dna(dna)
+                    sim.run_creature(cr, max_frame = 1000, early_exit = policy)
+                    results.append((cr.last_position, cr.exit_reason, cr.exit_frame))
+            self.assertEqual(results[0::2], [results[0]] * 3)
+            self.assertEqual(results[1::2], [results[1]] * 3)
+
+    def testWarmWorld(self):
+        for use_urdf in [False, True]:
+            sim_1 = simulation.Simulation(use_urdf = use_urdf)
+            sim_2 = simulation.Simulation(use_urdf = use_urdf, warm_world = True, warm_world_runs = 3)
+            for i in range(5):
+                cr_1 = creature.Creature(np.random.randint(2, 5))
+                cr_2 = copy.deepcopy(cr_1)
+                sim_1.run_creature(cr_1, max_frame = 480)
+                sim_2.run_creature(cr_2, max_frame = 480)
+                self.assertEqual(cr_1.last_position, cr_2.last_position)
+                self.assertEqual(p.getNumBodies(physicsClientId = sim_2.client_id), 2)
+                self.assertEqual(sim_2.world_runs, i % 3 + 1)
+
+    def testBatchedWorld(self):
+        sim = simulation.Simulation()
+        crs_1 = [creature.Creature(k % 3 + 2, rng = k) for k in range(4)]
+        crs_2 = [copy.deepcopy(cr) for cr in crs_1]
+        for cr in crs_1:
+            sim.run_creature(cr, max_frame = 480)
+        sim.run_creatures(crs_2, max_frame = 480)
+        self.assertEqual(p.getNumBodies(physicsClientId = sim.client_id), 5)
+        for cr_1, cr_2 in zip(crs_1, crs_2):
+            self.assertEqual(cr_2.exit_reason, "max_frame")
+            self.assertAlmostEqual(cr_1.get_distance(), cr_2.get_distance(), delta = .1)
+            self.assertAlmostEqual(cr_1.last_position[0], cr_2.last_position[0], delta = .1)
+
+    def testMultiProcessBatchedWorld(self):
+        pop = population.Population(5, 3)
+        eval_cache = cache.EvalCache()
+        with simulation.MultiProcessSim(2, eval_cache) as multisim:
+            multisim.eval_population(pop, max_frame = 480, batch_size = 2)
+            self.assertEqual(multisim.exit_counts["max_frame"], 5)
+        self.assertEqual(len(eval_cache), 5)
+        self.assertTrue(eval_cache.lookup(pop.creatures[0], **simulation.MultiProcessSim.get_sim_params(480, batch_size = 2)))
+        self.assertFalse(eval_cache.lookup(pop.creatures[0], **simulation.MultiProcessSim.get_sim_params(480)))
+
+    def testMultiProcessSkipsImmobile(self):
+        pop = population.Population(4, 3)
+        for cr in pop.creatures[:2]:
+            dna = cr.dna.copy()
+            dna[:, cr.spec["control_amp"]["index"]] = 0
+            cr.update_dna(dna)
+        with simulation.MultiProcessSim(2) as multisim:
+            multisim.eval_population(pop, max_frame = 480)
+            self.assertEqual(multisim.skipped_sims, 2)
+            self.assertEqual(sum(multisim.exit_counts.values()), 2)
+            multisim.eval_population(pop, max_frame = 480, racing = simulation.Racing(2, .5))
+            self.assertEqual(multisim.skipped_sims, 2)
+        fits = manipulation.Selection.eval_fitness(pop.creatures)
+        self.assertEqual(fits[:2].tolist(), [0, 0])
+        self.assertEqual([cr.exit_reason for cr in pop.creatures[:2]], ["immobile"] * 2)
+
+    def testRunVariants(self):
+        for use_urdf in [False, True]:
+            sim = simulation.Simulation(use_urdf = use_urdf)
+            crs_1 = get_variants(creature.Creature(3), 4)
+            crs_2 = copy.deepcopy(crs_1)
+            for cr in crs_1:
+                sim.run_creature(cr, max_frame = 480)
+            sim.run_variants(crs_2, max_frame = 480)
+            self.assertEqual(p.getNumBodies(physicsClientId = sim.client_id), 2)
+            for cr_1, cr_2 in zip(crs_1, crs_2):
+                self.assertEqual((cr_1.last_position, cr_1.exit_reason), (cr_2.last_position, cr_2.exit_reason))
+
+        sim.run_variants(crs_2, max_frame = 480, settle_frames = 240)
+        self.assertEqual([cr.exit_frame for cr in crs_2], [480] * 4)
+        with self.assertRaises(AssertionError):
+            sim.run_variants(crs_2 + [creature.Creature(3)], max_frame = 480)
+
+    def testMultiProcessGroupVariants(self):
+        pop_1 = population.Population(8, 3)
+        pop_1.reset_population(get_variants(pop_1.creatures[0], 5) + get_variants(pop_1.creatures[1], 3))
+        pop_2 = population.Population(8, 3)
+        pop_2.reset_population([copy.deepcopy(cr) for cr in pop_1.creatures])
+        with simulation.MultiProcessSim(2) as multisim:
+            multisim.eval_population(pop_1, max_frame = 480)
+            multisim.eval_population(pop_2, max_frame = 480, group_variants = True)
+        for cr_1, cr_2 in zip(pop_1.creatures, pop_2.creatures):
+            self.assertEqual(cr_1.last_position, cr_2.last_position)
+
+        params = simulation.MultiProcessSim.get_sim_params(480)
+        self.assertEqual(params, simulation.MultiProcessSim.get_sim_params(480, settle_frames = 0))
+        self.assertNotEqual(params, simulation.MultiProcessSim.get_sim_params(480, settle_frames = 240))
+
+    def testMultiProcessWarmWorld(self):
+        pop_1 = population.Population(6, 3)
+        pop_2 = population.Population(6, 3)
+        pop_2.reset_population([copy.deepcopy(cr) for cr in pop_1.creatures])
+        with simulation.MultiProcessSim(2) as multisim:
+            multisim.eval_population(pop_1, max_frame = 480)
+        with simulation.MultiProcessSim(2, warm_world = True) as multisim:
+            multisim.eval_population(pop_2, max_frame = 480)
+        for cr_1, cr_2 in zip(pop_1.creatures, pop_2.creatures):
+            self.assertEqual(cr_1.last_position, cr_2.last_position)
+
+class EarlyExitTest(unittest.TestCase):
+    def testEarlyExitDisabled(self):
+        sim = simulation.Simulation()
+        cr = creature.Creature(3)
+        sim.run_creature(cr, max_frame = 720)
+        last_position = cr.last_position
+        self.assertEqual((cr.exit_reason, cr.exit_frame), ("max_frame", 720))
+
+        cr_2 = creature.Creature(1)
+        cr_2.update_dna(cr.dna)
+        sim.run_creature(cr_2, max_frame = 720, early_exit = simulation.EarlyExit())
+        self.assertEqual(cr_2.last_position, last_position)
+        self.assertEqual((cr_2.exit_reason, cr_2.exit_frame), ("max_frame", 720))
+
+    def testEarlyExitPolicies(self):
+        sim = simulation.Simulation()
+        cr = creature.Creature(3)
+        sim.run_creature(cr, max_frame = 2400, early_exit = simulation.EarlyExit(stall_window = 480, stall_distance = 1000))
+        self.assertEqual((cr.exit_reason, cr.exit_frame), ("stall", 720))
+
+        sim.run_creature(cr, max_frame = 2400, early_exit = simulation.EarlyExit(elite_fitness = 1e9))
+        self.assertEqual((cr.exit_reason, cr.exit_frame), ("bound", 240))
+
+        sim.run_creature(cr, max_frame = 2400, early_exit = simulation.EarlyExit(max_tilt = np.pi))
+        self.assertEqual(cr.exit_reason, "max_frame")
+
+        cr = creature.Creature(3, rng = 0)
+        sim.run_creature(cr, max_frame = 2400, early_exit = simulation.EarlyExit(max_tilt = .01))
+        self.assertEqual((cr.exit_reason, cr.exit_frame), ("fall", 240))
+
+        with self.assertRaises(AssertionError):
+            simulation.EarlyExit(stall_window = 100)
+
+    def testEarlyExitCacheKey(self):
+        cr = creature.Creature(3)
+        params_1 = simulation.MultiProcessSim.get_sim_params(2400)
+        params_2 = simulation.MultiProcessSim.get_sim_params(2400, simulation.EarlyExit(stall_window = 480))
+        params_3 = simulation.MultiProcessSim.get_sim_params(2400, simulation.EarlyExit(stall_window = 480))
+        self.assertEqual(params_1, {"max_frame": 2400, "profile": simulation.PhysicsProfile()})
+        self.assertNotEqual(cache.EvalCache.get_key(cr, **params_1), cache.EvalCache.get_key(cr, **params_2))
+        self.assertEqual(cache.EvalCache.get_key(cr, **params_2), cache.EvalCache.get_key(cr, **params_3))
+
+    def testMultiProcessExitCounts(self):
+        pop = population.Population(4, 3)
+        with simulation.MultiProcessSim(2) as multisim:
+            multisim.eval_population(pop, max_frame = 480, early_exit = simulation.EarlyExit(elite_fitness = 1e9))
+            self.assertEqual(multisim.exit_counts["bound"], 4)
+        for cr in pop.creatures:
+            self.assertEqual(cr.exit_frame, 240)
+
+class PhysicsProfileTest(unittest.TestCase):
+    def testPhysicsProfiles(self):
+        full = simulation.PhysicsProfile.get_profile("full")
+        screening = simulation.PhysicsProfile.get_profile("screening")
+        self.assertEqual(full, simulation.PhysicsProfile())
+        self.assertEqual(full.get_max_frame(2400), 2400)
+        self.assertEqual(screening.get_max_frame(2400), 1200)
+        self.assertEqual(screening.get_max_frame(1), screening.frame_stride)
+        with self.assertRaises(AssertionError):
+            simulation.PhysicsProfile(frame_stride = 7)
+
+    def testScreeningRun(self):
+        sim = simulation.Simulation()
+        screening = simulation.PhysicsProfile.get_profile("screening")
+        cr_1 = creature.Creature(3)
+        cr_2 = copy.deepcopy(cr_1)
+        sim.run_creature(cr_1, max_frame = 960)
+        sim.run_creature(cr_2, max_frame = 960, profile = screening)
+        self.assertEqual((cr_1.physics_profile, cr_1.exit_frame), ("full", 960))
+        self.assertEqual((cr_2.physics_profile, cr_2.exit_frame), ("screening", 480))
+        self.assertNotEqual(cr_1.last_position, cr_2.last_position)
+
+        cr_3 = copy.deepcopy(cr_1)
+        sim.run_creature(cr_3, max_frame = 960, profile = simulation.PhysicsProfile())
+        self.assertEqual(cr_1.last_position, cr_3.last_position)
+
+    def testMultiProcessProfileCache(self):
+        pop = population.Population(4, 3)
+        eval_cache = cache.EvalCache()
+        screening = simulation.PhysicsProfile.get_profile("screening")
+        with simulation.MultiProcessSim(2, eval_cache) as multisim:
+            multisim.eval_population(pop, max_frame = 480, profile = screening)
+            self.assertEqual([cr.physics_profile for cr in pop.creatures], ["screening"] * 4)
+            multisim.eval_population(pop, max_frame = 480)
+            self.assertEqual([cr.physics_profile for cr in pop.creatures], ["full"] * 4)
+            self.assertEqual((eval_cache.hits, eval_cache.misses), (0, 8))
+            multisim.eval_population(pop, max_frame = 480, profile = screening)
+            self.assertEqual([cr.physics_profile for cr in pop.creatures], ["screening"] * 4)
+            self.assertEqual(eval_cache.hits, 4)
+
+class RacingTest(unittest.TestCase):
+    def testRacingHorizons(self):
+        self.assertEqual(simulation.Racing(3, .5).get_horizons(2400), [600, 1200, 2400])
+        self.assertEqual(simulation.Racing(1).get_horizons(2400), [2400])
+        self.assertEqual(simulation.Racing().get_horizons(2400), [300, 600, 1200, 2400])
+        self.assertEqual(simulation.Racing().get_frame_fraction(2400), .5)
+        self.assertEqual(simulation.Racing(3, .5).get_frame_fraction(2400), .75)
+        self.assertEqual(simulation.Racing(1).get_frame_fraction(2400), 1)
+        with self.assertRaises(AssertionError):
+            simulation.Racing(keep_fraction = 0)
+
+    def testRacingExtrapolation(self):
+        cr = creature.Creature(3)
+        cr.update_position((1, -2, 0.5))
+        simulation.Racing.extrapolate(cr, 600, 2400)
+        self.assertEqual(cr.last_position, (4, -8, 0.5))
+        self.assertEqual((cr.exit_reason, cr.exit_frame), ("racing", 600))
+
+        cr.update_position((1, 0, 0))
+        cr.exit_reason = "stall"
+        simulation.Racing.extrapolate(cr, 600, 2400)
+        self.assertEqual(cr.last_position, (1, 0, 0))
+
+    def testMultiProcessRacing(self):
+        pop_1 = population.Population(8, 3)
+        pop_2 = population.Population(8, 3)
+        pop_2.reset_population([copy.deepcopy(cr) for cr in pop_1.creatures])
+
+        with simulation.MultiProcessSim(4) as multisim:
+            multisim.eval_population(pop_1, max_frame = 960)
+            multisim.eval_population(pop_2, max_frame = 960, racing = simulation.Racing(3, .5))
+            self.assertEqual(multisim.exit_counts["racing"], 6)
+
+        exit_reasons = [cr.exit_reason for cr in pop_2.creatures]
+        self.assertEqual(exit_reasons.count("racing"), 6)
+        for cr_1, cr_2 in zip(pop_1.creatures, pop_2.creatures):
+            if cr_2.exit_reason != "racing":
+                self.assertEqual(cr_1.last_position, cr_2.last_position)
+
+    def testCachedRacing(self):
+        pop = population.Population(6, 3)
+        racing = simulation.Racing(2, .5)
+        with simulation.MultiProcessSim(2, cache.EvalCache()) as multisim:
+            multisim.eval_population(pop, max_frame = 480, racing = racing)
+            results = [(cr.last_position, cr.exit_reason, cr.exit_frame) for cr in pop.creatures]
+            multisim.eval_population(pop, max_frame = 480, racing = racing)
+            self.assertEqual((multisim.eval_cache.hits, multisim.eval_cache.misses), (9, 9))
+            self.assertEqual(results, [(cr.last_position, cr.exit_reason, cr.exit_frame) for cr in pop.creatures])
+
+            with self.assertRaises(AssertionError):
+                multisim.eval_population(pop, max_frame = 480, early_exit = simulation.EarlyExit(elite_fitness = 1), racing = racing)
+
+class ScreeningTest(unittest.TestCase):
+    def testMultiProcessScreening(self):
+        pop_1 = population.Population(8, 3)
+        pop_2 = population.Population(8, 3)
+        pop_3 = population.Population(8, 3)
+        pop_2.reset_population(list(pop_1.creatures))
+        pop_3.reset_population(list(pop_1.creatures))
+        screening = simulation.Screening(keep_fraction = .25)
+
+        with simulation.MultiProcessSim(4, skip_immobile = False) as multisim:
+            multisim.eval_population(pop_1, max_frame = 480, profile = screening.profile)
+            multisim.eval_population(pop_2, max_frame = 480)
+            multisim.eval_population(pop_3, max_frame = 480, screening = screening)
+            self.assertEqual(sum(multisim.exit_counts.values()), 8)
+
+            with self.assertRaises(AssertionError):
+                multisim.eval_population(pop_3, max_frame = 480, early_exit = simulation.EarlyExit(elite_fitness = 1), screening = screening)
+
+        # the 2 fittest screening runs are re-run with the full profile, the others keep their screening result
+        fits = manipulation.Selection.eval_fitness(pop_1.creatures)
+        fittest = set(np.argsort(fits, kind = "stable")[::-1][:2])
+        for i, cr in enumerate(pop_3.creatures):
+            self.assertEqual(cr.physics_profile, "full" if i in fittest else "screening")
+            expected = pop_2.creatures[i] if i in fittest else pop_1.creatures[i]
+            self.assertEqual(cr.last_position, expected.last_position)
+
+class CostModelTest(unittest.TestCase):
+    def testCostEstimate(self):
+        cost_model = simulation.CostModel()
+        cr_1 = creature.Creature(2)
+        cr_2 = creature.Creature(6)
+        self.assertLessEqual(len(cr_1.get_expanded_links()), len(cr_2.get_expanded_links()))
+        self.assertLessEqual(cost_model.estimate_cost(cr_1), cost_model.estimate_cost(cr_2))
+        self.assertLess(cost_model.estimate_cost(cr_1, 240), cost_model.estimate_cost(cr_1, 2400))
+
+    def testCostModelFit(self):
+        cost_model = simulation.CostModel()
+        for n_gene in range(2, 6):
+            cr = creature.Creature(n_gene)
+            cost_model.record(cr, 2400, 0.5 + 1e-6 * len(cr.get_expanded_links()) * 2400)
+        cost_model.record(creature.Creature(1), 2400, 0.5 + 1e-6 * 2400)
+
+        intercept, slope = cost_model.fit()
+        self.assertAlmostEqual(intercept, 0.5)
+        self.assertAlmostEqual(slope, 1e-6)
+        self.assertEqual(cost_model.report()["n_samples"], 5)
+
+    def testMultiProcessRecordsTimings(self):
+        pop = population.Population(4, 3)
+        with simulation.MultiProcessSim(2) as multisim:
+            multisim.eval_population(pop, max_frame = 240)
+            report = multisim.cost_model.report()
+        self.assertEqual(report["n_samples"], 4)
+        self.assertGreater(report["total_seconds"], 0)
@@ -5,5 +5,8 @@ from test.test_motor import *
 from test.test_simulation import *
 from test.test_population import *
 from test.test_manipulation import *
+from test.test_cache import *
+from test.test_loader import *
+from test.test_population_arrays import *
 
 unittest.main()
\ No newline at end of file